@@ -21,22 +21,40 @@
 import os
 os.environ['DJANGO_SETTINGS_MODULE'] = 'pootle.settings'
 
+from optparse import make_option
+
 from pootle_app.management.commands import PootleCommand
+from pootle_misc.util import deletefromcache
 
 class Command(PootleCommand):
+    option_list = PootleCommand.option_list + (
+        make_option('--rebuild', action='store_true', dest='rebuild', default=False,
+                    help="recalculate stored stats counters from scratch"),
+        )
     help = "Allow stats and text indices to be refreshed manually."
 
     def handle_translation_project(self, translation_project, **options):
-        # This will force the indexer of a TranslationProject to be
-        # initialized. The indexer will update the text index of the
-        # TranslationProject if it is out of date.
-        translation_project.indexer
+        # Brings the text index of the TranslationProject up to date,
+        # building it if it doesn't exist yet.
+        translation_project.update_search_index()
 
     def handle_all_stores(self, translation_project, **options):
+        if options.get('rebuild', False):
+            for store in translation_project.stores.iterator():
+                self.rebuild_store(store)
+            translation_project.forget_stats()
+        translation_project.require_qualitychecks(background=False)
         translation_project.getcompletestats()
         translation_project.getquickstats()
 
     def handle_store(self, store, **options):
+        if options.get('rebuild', False):
+            self.rebuild_store(store)
+        store.require_qualitychecks(background=False)
         store.getcompletestats()
         store.getquickstats()
 
+    def rebuild_store(self, store):
+        store.refresh_stats()
+        deletefromcache(store, ["getquickstats", "getcompletestats", "get_mtime", "has_suggestions"])
+
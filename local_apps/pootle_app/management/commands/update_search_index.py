@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Zuza Software Foundation
+#
+# This file is part of Pootle.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import os
+os.environ['DJANGO_SETTINGS_MODULE'] = 'pootle.settings'
+
+import time
+from optparse import make_option
+
+from django.db import connection
+
+from pootle_app.management.commands import PootleCommand
+from pootle_store.models import UnitChange
+from pootle_translationproject.models import TranslationProject
+
+class Command(PootleCommand):
+    option_list = PootleCommand.option_list + (
+        make_option('--interval', type='int', dest='interval', default=0,
+                    help="keep running, looking for changed units every INTERVAL seconds"),
+        )
+    help = "Update search indices with the units changed since they were last updated."
+
+    def handle_translation_project(self, translation_project, **options):
+        translation_project.update_search_index()
+
+    def handle_noargs(self, **options):
+        interval = options.get('interval', 0)
+        while True:
+            super(Command, self).handle_noargs(**options)
+            if not (options.get('directory') or options.get('projects') or \
+                    options.get('languages') or options.get('path')):
+                self.prune_changes()
+            if not interval:
+                break
+            # don't hold on to a database connection while sleeping
+            connection.close()
+            time.sleep(interval)
+
+    def prune_changes(self):
+        """forget changes that all search indices include"""
+        marks = [tp.get_index_mark() for tp in TranslationProject.objects.iterator()]
+        marks = [mark for mark in marks if mark is not None]
+        if marks:
+            UnitChange.objects.filter(id__lte=min(marks)).delete()
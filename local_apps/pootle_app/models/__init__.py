@@ -20,7 +20,7 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 from pootle_app.models.suggestion import Suggestion
-from pootle_app.models.directory import Directory
+from pootle_app.models.directory import Directory, DirectoryAncestor, StoreAncestor
 from pootle_app.models.permissions import PermissionSet
 
-__all__ = ["Suggestion", "Directory", "PermissionSet"]
+__all__ = ["Suggestion", "Directory", "DirectoryAncestor", "StoreAncestor", "PermissionSet"]
@@ -22,10 +22,12 @@
 from django.db import models
 
 from pootle_store.util import empty_quickstats, empty_completestats, statssum, completestatssum
-from pootle_store.models import Suggestion, Unit
+from pootle_store.models import Unit, rollup_stats, calculate_check_stats
+from pootle_statistics.models import PathStats
 
 from pootle_misc.util import getfromcache, dictsum
 from pootle_misc.aggregate import max_column
+from pootle_misc.bulk import bulk_insert
 from pootle_misc.baseurl import l
 
 class DirectoryManager(models.Manager):
@@ -61,7 +63,37 @@ class Directory(models.Model):
         else:
             self.pootle_path = '/'
 
+        created = self.id is None
         super(Directory, self).save(*args, **kwargs)
+        if created:
+            self._link_ancestors()
+
+    def _get_ancestor_depths(self):
+        """list of (ancestor id, depth) including this directory at
+        depth 0"""
+        return list(DirectoryAncestor.objects.filter(descendant=self).values_list('ancestor', 'depth'))
+
+    def _link_ancestors(self):
+        links = [DirectoryAncestor(ancestor_id=self.id, descendant_id=self.id, depth=0)]
+        if self.parent_id is not None:
+            links.extend([DirectoryAncestor(ancestor_id=ancestor_id, descendant_id=self.id, depth=depth + 1)
+                          for ancestor_id, depth in self.parent._get_ancestor_depths()])
+        bulk_insert(DirectoryAncestor, links)
+
+    def link_store(self, store):
+        """add a store created in this directory to the directory
+        tree"""
+        bulk_insert(StoreAncestor, [StoreAncestor(ancestor_id=ancestor_id, store_id=store.id, depth=depth + 1)
+                                    for ancestor_id, depth in self._get_ancestor_depths()])
+
+    def descendant_stores(self):
+        """queryset with all stores under this directory"""
+        from pootle_store.models import Store
+        return Store.objects.filter(ancestor_links__ancestor=self)
+
+    def descendant_units(self):
+        """queryset with all units of stores under this directory"""
+        return Unit.objects.filter(store__ancestor_links__ancestor=self)
 
     def get_relative(self, path):
         """Given a path of the form a/b/c, where the path is relative
@@ -84,16 +116,54 @@ class Directory(models.Model):
         else:
             return self
 
+    def _calculate_mtime(self):
+        return max_column(self.descendant_units(), 'mtime', None)
+
+    def _calculate_quickstats(self):
+        """calculate aggregate stats for all directory based on stats
+        of all descenging stores and dirs"""
+        if self._has_rollup():
+            # seeds the rollup, read straight from the database since
+            # cached stats of children may be stale
+            return rollup_stats(self.descendant_stores())
+        file_result = statssum(self.child_stores.iterator())
+        dir_result  = statssum(self.child_dirs.iterator())
+        return dictsum(file_result, dir_result)
+
+    def _calculate_completestats(self):
+        if self._has_rollup():
+            from pootle_store.models import CHECKED
+            # rollups only count checks of stores that finished checking
+            return calculate_check_stats(self.descendant_units().filter(store__state__gte=CHECKED))
+        file_result = completestatssum(self.child_stores.iterator())
+        dir_result  = completestatssum(self.child_dirs.iterator())
+        return dictsum(file_result, dir_result)
+
+    def has_pending_checks(self):
+        from pootle_store.models import PARSED, CHECKED
+        return self.descendant_stores().filter(state__gte=PARSED, state__lt=CHECKED).exists()
+
+    def _has_rollup(self):
+        """stores don't propagate changes to the root and projects
+        directories or to templates"""
+        return self.parent_id is not None and self.pootle_path != '/projects/' and \
+               not self.is_template_project
+
+    def get_rollup(self):
+        """stats rollup of all stores under this directory"""
+        if self.is_project():
+            return self.project.get_rollup()
+        elif self.is_language():
+            return self.language.get_rollup()
+        return PathStats.objects.get_rollup(self.pootle_path, self._calculate_quickstats, self._calculate_mtime)
+
     @getfromcache
     def get_mtime(self):
-        return max_column(Unit.objects.filter(store__pootle_path__startswith=self.pootle_path), 'mtime', None)
-
-    def _get_stores(self):
-        """queryset with all descending stores"""
-        from pootle_store.models import Store
-        return Store.object.filter(pootle_path__startswith=self.pootle_path)
+        if not self._has_rollup():
+            return self._calculate_mtime()
+        return self.get_rollup().mtime
 
-    stores = property(_get_stores)
+    stores = property(descendant_stores)
 
     def get_or_make_subdir(self, child_name):
         child_dir, created = Directory.objects.get_or_create(name=child_name, parent=self)
@@ -107,30 +177,22 @@ class Directory(models.Model):
 
     @getfromcache
     def getquickstats(self):
-        """calculate aggregate stats for all directory based on stats
-        of all descenging stores and dirs"""
+        """aggregate stats for all descending stores"""
         if self.is_template_project:
             #FIXME: Hackish return empty_stats to avoid messing up
             # with project and language stats
             return empty_quickstats
-        #FIXME: can we replace this with a quicker path query?
-        file_result = statssum(self.child_stores.iterator())
-        dir_result  = statssum(self.child_dirs.iterator())
-        stats = dictsum(file_result, dir_result)
-        return stats
-
-        #return calculate_stats(Unit.objects.filter(store__pootle_path__startswith=self.pootle_path))
+        if not self._has_rollup():
+            return self._calculate_quickstats()
+        return self.get_rollup().get_quickstats()
 
     @getfromcache
     def getcompletestats(self):
         if self.is_template_project:
             return empty_completestats
-        file_result = completestatssum(self.child_stores.iterator())
-        dir_result  = completestatssum(self.child_dirs.iterator())
-        stats = dictsum(file_result, dir_result)
-        return stats
-        #queryset = QualityCheck.objects.filter(unit__store__pootle_path__startswith=self.pootle_path, false_positive=False)
-        #return group_by_count(queryset, 'name')
+        if not self._has_rollup():
+            return self._calculate_completestats()
+        return self.get_rollup().get_completestats(self._calculate_completestats)
 
     def trail(self, only_dirs=True):
         """return list of ancestor directories excluding TranslationProject and above"""
@@ -151,7 +213,7 @@ class Directory(models.Model):
 
     def has_suggestions(self):
         """check if any child store has suggestions"""
-        return Suggestion.objects.filter(unit__store__pootle_path__startswith=self.pootle_path).count() > 0
+        return self.getquickstats().get('suggestions', 0) > 0
 
     def is_language(self):
         """does this directory point at a language"""
@@ -193,3 +255,61 @@ class Directory(models.Model):
         if translation_project:
             path_prefix = self.pootle_path[len(translation_project.pootle_path)-1:-1]
             return translation_project.real_path + path_prefix
+
+
+class DirectoryAncestor(models.Model):
+    """closure of the directory tree, links every directory to itself
+    and to each of its ancestors"""
+    class Meta:
+        app_label = "pootle_app"
+        unique_together = ('ancestor', 'descendant')
+
+    ancestor   = models.ForeignKey(Directory, related_name='descendant_links', db_index=True)
+    descendant = models.ForeignKey(Directory, related_name='ancestor_links', db_index=True)
+    depth      = models.IntegerField()
+
+
+class StoreAncestor(models.Model):
+    """links every store to each of the directories above it"""
+    class Meta:
+        app_label = "pootle_app"
+        unique_together = ('ancestor', 'store')
+
+    ancestor = models.ForeignKey(Directory, related_name='store_links', db_index=True)
+    store    = models.ForeignKey('pootle_store.Store', related_name='ancestor_links', db_index=True)
+    depth    = models.IntegerField()
+
+
+def rebuild_directory_tree():
+    """recreate the closure tables of the directory tree from scratch"""
+    from pootle_store.models import Store
+
+    DirectoryAncestor.objects.all().delete()
+    StoreAncestor.objects.all().delete()
+    parents = dict(Directory.objects.values_list('id', 'parent'))
+    ancestors = {}
+
+    def get_ancestors(directory_id):
+        """ids of directory_id and its ancestors, nearest first"""
+        if directory_id not in ancestors:
+            chain = [directory_id]
+            parent_id = parents.get(directory_id)
+            if parent_id is not None:
+                chain.extend(get_ancestors(parent_id))
+            ancestors[directory_id] = chain
+        return ancestors[directory_id]
+
+    links = []
+    for directory_id in parents:
+        for depth, ancestor_id in enumerate(get_ancestors(directory_id)):
+            links.append(DirectoryAncestor(ancestor_id=ancestor_id, descendant_id=directory_id, depth=depth))
+    bulk_insert(DirectoryAncestor, links)
+
+    links = []
+    for store_id, parent_id in Store.objects.values_list('id', 'parent').iterator():
+        for depth, ancestor_id in enumerate(get_ancestors(parent_id)):
+            links.append(StoreAncestor(ancestor_id=ancestor_id, store_id=store_id, depth=depth + 1))
+        if len(links) >= 5000:
+            bulk_insert(StoreAncestor, links)
+            links = []
+    bulk_insert(StoreAncestor, links)
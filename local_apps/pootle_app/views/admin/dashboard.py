@@ -21,6 +21,7 @@
 
 import locale
 
+from django.conf import settings
 from django.http import HttpResponse
 from django.utils.translation import ugettext as _
 from django.shortcuts import render_to_response
@@ -35,10 +36,13 @@ from pootle import depcheck
 from pootle_app.views.admin.util import user_is_admin
 from pootle_misc.aggregate import sum_column
 from pootle_app.models import Suggestion as SuggestiontStat
-from pootle_store.models import Unit, Suggestion
+from pootle_store.models import Store, Unit, Suggestion, PARSED, CHECKED
 from pootle_profile.models import PootleProfile
 from pootle_store.util import TRANSLATED
 from pootle_statistics.models import Submission
+from pootle_misc.localcache import local_cache
+from pootle_store.fields import TranslationStoreFieldFile
+from pootle_translationproject.models import TranslationProject
 
 def required_depcheck():
     required = []
@@ -94,6 +98,10 @@ def optional_depcheck():
         optional.append({'dependency': 'levenshtein',
                         'text': _("Can't find python-levenshtein package. Updating from templates is faster with python-levenshtein.")})
 
+    if settings.WATCH_TRANSLATION_FILES and not depcheck.test_pyinotify():
+        optional.append({'dependency': 'pyinotify',
+                         'text': _("Can't find the pyinotify package. Pootle needs pyinotify to watch translation files for changes.")})
+
     if not depcheck.test_indexer():
         optional.append({'dependency': 'indexer',
                          'text': _("No text indexing engine found. Searching is faster if an indexing engine like Xapian or Lucene is installed.")})
@@ -168,6 +176,15 @@ def server_stats():
         cache.set("server_stats", result, 86400)
     return result
 
+def check_stats():
+    """progress of quality checks run in the background"""
+    result = {
+        'pending_count': Store.objects.filter(state__gte=PARSED, state__lt=CHECKED).count(),
+        'done_count': Store.objects.filter(state__gte=CHECKED).count(),
+        }
+    _format_numbers(result)
+    return result
+
 @user_is_admin
 def server_stats_more(request):
     result = cache.get("server_stats_more")
@@ -205,6 +222,10 @@ def server_stats_more(request):
 def view(request):
     template_vars = {
         'server_stats': server_stats(),
+        'local_cache_stats': local_cache.get_stats(),
+        'check_stats': check_stats(),
+        'memory_pools': [TranslationStoreFieldFile._store_cache.get_stats(),
+                         TranslationProject._non_db_state_cache.get_stats()],
         'required': required_depcheck(),
         'optional': optional_depcheck(),
         'optimal': optimal_depcheck(),
@@ -26,7 +26,6 @@ from django.utils.translation import ungettext
 
 from translate.storage import versioncontrol
 from pootle_app.models.permissions     import check_permission
-from pootle_store.models               import Store
 from pootle_app.views.language         import dispatch
 from pootle_misc.util import add_percentages
 
@@ -52,7 +51,7 @@ def get_item_summary(request, quick_stats, path_obj):
     if not path_obj.is_dir:
         summary = '%s %s' % (word_stats, string_stats)
     else:
-        num_stores = Store.objects.filter(pootle_path__startswith=path_obj.pootle_path).count()
+        num_stores = path_obj.descendant_stores().count()
         file_stats = ungettext("%d file", "%d files", num_stores, num_stores)
         summary = '%s %s %s' % (file_stats, word_stats, string_stats)
 
@@ -65,6 +64,7 @@ def get_item_stats(request, quick_stats, path_obj, show_checks=False):
         }
     if show_checks:
         result['checks'] = getcheckdetails(request, path_obj)
+        result['checks_pending'] = path_obj.has_pending_checks()
     return result
 
 def getcheckdetails(request, path_obj):
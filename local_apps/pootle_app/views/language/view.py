@@ -25,7 +25,7 @@ from django.core.exceptions import PermissionDenied
 from pootle_misc.baseurl import redirect
 from pootle_translationproject.models import TranslationProject
 from pootle_store.models import Store, Unit
-from pootle_store.views import translate_page, get_failing_checks, get_view_units
+from pootle_store.views import translate_page, get_failing_checks, get_view_units, search_units
 from pootle_profile.models import get_profile
 
 from pootle_app.views.language     import dispatch
@@ -96,11 +96,23 @@ def get_failing_checks_dir(request, translation_project, dir_path):
 def get_view_units_dir(request, translation_project, dir_path):
     if dir_path:
         pootle_path = translation_project.pootle_path + dir_path
-        units_query = Unit.objects.filter(store__pootle_path__startswith=pootle_path)
+        directory = get_object_or_404(Directory, pootle_path=pootle_path)
+        units_query = directory.descendant_units()
     else:
         units_query = Unit.objects.filter(store__translation_project=translation_project)
     return get_view_units(request, units_query)
 
+@get_translation_project
+@set_request_context
+def search_units_dir(request, translation_project, dir_path):
+    if dir_path:
+        pootle_path = translation_project.pootle_path + dir_path
+        directory = get_object_or_404(Directory, pootle_path=pootle_path)
+        units_query = directory.descendant_units()
+    else:
+        units_query = Unit.objects.filter(store__translation_project=translation_project)
+    return search_units(request, units_query)
+
 
 ################################################################################
 @get_translation_project
@@ -23,12 +23,12 @@ from django.db                import models
 
 from pootle.i18n.gettext import tr_lang, language_dir
 
-from pootle_misc.util import getfromcache
+from pootle_misc.util import getfromcache, deletefromcache
 from pootle_misc.aggregate import max_column
 from pootle_misc.baseurl import l
-from pootle_store.util import statssum
-from pootle_store.models import Unit
+from pootle_store.models import Store, Unit, rollup_stats
 from pootle_app.lib.util import RelatedManager
+from pootle_statistics.models import PathStats
 
 class LanguageManager(RelatedManager):
     def get_by_natural_key(self, code):
@@ -70,6 +70,8 @@ class Language(models.Model):
         directory = self.directory
         super(Language, self).delete(*args, **kwargs)
         directory.delete()
+        PathStats.objects.forget(prefix=self.pootle_path)
+        deletefromcache(self, ["getquickstats", "get_mtime"])
 
     def __repr__(self):
         return u'<%s: %s>' % (self.__class__.__name__, self.fullname)
@@ -77,13 +79,29 @@ class Language(models.Model):
     def __unicode__(self):
         return u"%s - %s" % (self.localname(), self.code)
 
+    def get_rollup(self):
+        """stats rollup of all translation projects in this language"""
+        return PathStats.objects.get_rollup(self.pootle_path,
+                                            lambda: rollup_stats(self._get_rollup_stores()),
+                                            self._calculate_mtime)
+
+    def _get_rollup_stores(self):
+        """stores whose stats are aggregated in the rollup, template
+        translation projects are left out"""
+        translation_projects = [translation_project.id for translation_project in self.translationproject_set.iterator()
+                                if not translation_project.is_template_project]
+        return Store.objects.filter(translation_project__in=translation_projects)
+
+    def _calculate_mtime(self):
+        return max_column(Unit.objects.filter(store__translation_project__language=self), 'mtime', None)
+
     @getfromcache
     def get_mtime(self):
-        return max_column(Unit.objects.filter(store__translation_project__language=self), 'mtime', None)
+        return self.get_rollup().mtime
 
     @getfromcache
     def getquickstats(self):
-        return statssum(self.translationproject_set.iterator())
+        return self.get_rollup().get_quickstats()
 
     def get_absolute_url(self):
         return l(self.pootle_path)
@@ -84,3 +84,25 @@ except ImportError:
             result.append(item)
         result.sort(key=lambda x: x['count'], reverse=True)
         return result
+
+def count_flags(queryset, column, flags):
+    """count the rows in queryset having each flag set in the integer
+    column, flags is a dictionary of names and bit values. returns a
+    dictionary of names with non zero counts"""
+    if not flags:
+        return {}
+    from django.db import connection
+    qn = connection.ops.quote_name
+
+    query = queryset.order_by().values_list(column).query
+    if hasattr(query, 'get_compiler'):
+        sql, params = query.get_compiler(queryset.db).as_sql()
+    else:
+        sql, params = query.as_sql()
+    names = flags.keys()
+    sums = ", ".join(["SUM(CASE WHEN flagged.%s & %d <> 0 THEN 1 ELSE 0 END)" % (qn(column), int(flags[name]))
+                      for name in names])
+    cursor = connection.cursor()
+    cursor.execute("SELECT %s FROM (%s) flagged" % (sums, sql), params)
+    row = cursor.fetchone()
+    return dict((name, int(count)) for name, count in zip(names, row) if count)
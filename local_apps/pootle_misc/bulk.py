@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Zuza Software Foundation
+#
+# This file is part of Pootle.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""helpers for writing many rows at once, bypassing Model.save()"""
+
+from django.db import connection, transaction
+from django.db.models import AutoField
+
+SQLITE_MAX_VARIABLES = 999
+"""sqlite refuses statements with more host parameters than this"""
+
+def _insert_fields(model):
+    return [field for field in model._meta.local_fields if not isinstance(field, AutoField)]
+
+def bulk_insert(model, objects, batch_size=500):
+    """insert unsaved model instances using multi-row INSERT
+    statements of at most batch_size rows.
+
+    model save methods and signals are not triggered and primary keys
+    are not set on the instances."""
+    if not objects:
+        return
+
+    fields = _insert_fields(model)
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(field.column) for field in fields)
+    row_placeholder = "(%s)" % ", ".join(["%s"] * len(fields))
+
+    if connection.vendor == 'sqlite':
+        batch_size = min(batch_size, SQLITE_MAX_VARIABLES / len(fields))
+    batch_size = max(batch_size, 1)
+
+    cursor = connection.cursor()
+    for i in xrange(0, len(objects), batch_size):
+        batch = objects[i:i+batch_size]
+        params = []
+        for obj in batch:
+            for field in fields:
+                params.append(field.get_db_prep_save(field.pre_save(obj, True), connection=connection))
+        sql = "INSERT INTO %s (%s) VALUES %s" % (qn(model._meta.db_table), columns,
+                                                 ", ".join([row_placeholder] * len(batch)))
+        cursor.execute(sql, params)
+    transaction.commit_unless_managed()
+
+def bulk_delete(model, field_name, values, batch_size=500):
+    """delete the rows whose field_name is any of values using DELETE
+    statements with at most batch_size values each.
+
+    model delete methods, signals and cascades are not triggered."""
+    if not values:
+        return
+
+    qn = connection.ops.quote_name
+    column = model._meta.get_field(field_name).column
+    if connection.vendor == 'sqlite':
+        batch_size = min(batch_size, SQLITE_MAX_VARIABLES)
+
+    cursor = connection.cursor()
+    for i in xrange(0, len(values), batch_size):
+        batch = values[i:i+batch_size]
+        sql = "DELETE FROM %s WHERE %s IN (%s)" % (qn(model._meta.db_table), qn(column),
+                                                   ", ".join(["%s"] * len(batch)))
+        cursor.execute(sql, batch)
+    transaction.commit_unless_managed()
@@ -22,34 +22,36 @@ import sys
 import logging
 
 from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import F
 
 from pootle.i18n.gettext import ugettext as _
 from pootle.i18n.gettext import ungettext
 
 from pootle_app.models import Directory
-from pootle_store.models import Store, QualityCheck, CHECKED, PARSED
-from pootle_store.util import OBSOLETE
+from pootle_app.models.directory import DirectoryAncestor, StoreAncestor, rebuild_directory_tree
+from pootle_store.models import Store, Unit, UnitTrigram, TMTrigram, Suggestion, QualityCheck, QualityCheckName, CHECKED, PARSED, stats_columns
+from pootle_store.util import OBSOLETE, TRANSLATED
 from pootle_misc.util import deletefromcache
+from pootle_misc.aggregate import group_by_count
 from pootle_language.models import Language
 from pootle_project.models import Project
 from pootle_translationproject.models import TranslationProject
+from pootle_statistics.models import PathStats
 from pootle_misc.dbinit import stats_start, stats_language, stats_project, stats_end
 
 def flush_quality_checks():
-    """reverts stores to unchecked state. if store has false positives
-    marked updates quality checks keeping false postivies intact"""
-    for store in Store.objects.filter(state=CHECKED).iterator():
-        store_checks = QualityCheck.objects.filter(unit__store=store)
-        false_positives = store_checks.filter(false_positive=True).count()
-        if false_positives:
-            logging.debug("%s has false positives, updating quality checks", store.pootle_path)
-            for unit in store.units.iterator():
-                unit.update_qualitychecks(keep_false_positives=True)
-        else:
-            logging.debug("%s has no false positives, deleting checks", store.pootle_path)
-            store_checks.delete()
-            store.state = PARSED
-            store.save()
+    """reverts stores to unchecked state keeping false positives
+    intact, checks will be run again on demand"""
+    # check rollups will be recalculated on demand
+    PathStats.objects.invalidate_checks()
+    QualityCheck.objects.filter(false_positive=False).delete()
+    Unit.objects.exclude(check_mask=0).update(check_mask=0)
+    for store in Store.objects.filter(state__gte=PARSED).iterator():
+        store.state = PARSED
+        store.checked_upto = None
+        store.save()
 
 def header(db_buildversion):
     text = """
@@ -178,6 +180,147 @@ def update_ts_tt_12008():
         store.update(update_structure=True, update_translation=True, conservative=False)
     return text
 
+def update_tables_21070():
+    text = u"""
+    <p>%s</p>
+    """ % _('Adding stats counters to stores, they will be calculated on demand...')
+    logging.info("Adding stats counters to stores")
+    from south.db import db
+    table_name = Store._meta.db_table
+    for column in stats_columns:
+        field = Store._meta.get_field(column)
+        db.add_column(table_name, field.name, field)
+    return text
+
+def update_tables_21080():
+    text = u"""
+    <p>%s</p>
+    """ % _('Adding fingerprints to units, they will be calculated on the next update...')
+    logging.info("Adding fingerprints to units")
+    from south.db import db
+    field = Unit._meta.get_field('fingerprint')
+    db.add_column(Unit._meta.db_table, field.name, field)
+    return text
+
+def update_tables_21090():
+    text = u"""
+    <p>%s</p>
+    """ % _('Adding quality check progress to stores...')
+    logging.info("Adding quality check progress to stores")
+    from south.db import db
+    field = Store._meta.get_field('checked_upto')
+    db.add_column(Store._meta.db_table, field.name, field)
+    return text
+
+def update_tables_21100():
+    text = u"""
+    <p>%s</p>
+    """ % _('Adding quality check flags to units...')
+    logging.info("Adding quality check flags to units")
+    from south.db import db
+    field = Unit._meta.get_field('check_mask')
+    db.add_column(Unit._meta.db_table, field.name, field)
+    return text
+
+def update_check_masks_21100():
+    text = u"""
+    <p>%s</p>
+    """ % _('Calculating quality check flags of units...')
+    logging.info("Calculating quality check flags of units")
+    names = QualityCheck.objects.filter(false_positive=False).values_list('name', flat=True).distinct()
+    for name in list(names):
+        bit = QualityCheckName.objects.get_bit(name)
+        if bit is not None:
+            Unit.objects.filter(qualitycheck__name=name, qualitycheck__false_positive=False).update(check_mask=F('check_mask') + (1 << bit))
+    return text
+
+def update_tables_21110():
+    text = u"""
+    <p>%s</p>
+    """ % _('Adding suggestion counters to units and stores...')
+    logging.info("Adding suggestion counters to units and stores")
+    from south.db import db
+    cursor = connection.cursor()
+    tables = connection.introspection.get_table_list(cursor)
+    for model, name in ((Unit, 'suggestion_count'), (Store, 'stats_suggestions'), (PathStats, 'suggestions')):
+        table_name = model._meta.db_table
+        # stores got all stats counters if upgraded from before 21070,
+        # rollups didn't exist yet
+        if table_name not in tables:
+            continue
+        columns = [row[0] for row in connection.introspection.get_table_description(cursor, table_name)]
+        field = model._meta.get_field(name)
+        if field.column not in columns:
+            db.add_column(table_name, field.name, field)
+    return text
+
+def update_suggestion_counts_21110():
+    text = u"""
+    <p>%s</p>
+    """ % _('Counting pending suggestions...')
+    logging.info("Counting pending suggestions")
+    units_by_count = {}
+    for unit_id, count in group_by_count(Suggestion.objects.all(), 'unit').iteritems():
+        units_by_count.setdefault(count, []).append(unit_id)
+    for count, unit_ids in units_by_count.iteritems():
+        for start in xrange(0, len(unit_ids), 500):
+            Unit.objects.filter(id__in=unit_ids[start:start+500]).update(suggestion_count=count)
+
+    Store.objects.filter(stats_total__isnull=False).update(stats_suggestions=0)
+    counts = group_by_count(Suggestion.objects.filter(unit__state__gt=OBSOLETE), 'unit__store')
+    for store_id, count in counts.iteritems():
+        Store.objects.filter(id=store_id, stats_total__isnull=False).update(stats_suggestions=count)
+    # rollups will be recalculated on demand
+    PathStats.objects.forget(prefix='/')
+    return text
+
+def create_tables_21120():
+    text = u"""
+    <p>%s</p>
+    """ % _('Creating directory tree tables...')
+    logging.info("Creating directory tree tables")
+    # created ahead of syncdb, every directory or store saved while
+    # upgrading links itself into these tables
+    cursor = connection.cursor()
+    tables = connection.introspection.get_table_list(cursor)
+    style = no_style()
+    for model in (DirectoryAncestor, StoreAncestor):
+        if model._meta.db_table in tables:
+            continue
+        statements, pending = connection.creation.sql_create_model(model, style, set([Directory, Store]))
+        statements.extend(connection.creation.sql_indexes_for_model(model, style))
+        for statement in statements:
+            cursor.execute(statement)
+    transaction.commit_unless_managed()
+    return text
+
+def update_directory_tree_21120():
+    text = u"""
+    <p>%s</p>
+    """ % _('Indexing the directory tree...')
+    logging.info("Indexing the directory tree")
+    rebuild_directory_tree()
+    return text
+
+def update_search_index_21130():
+    text = u"""
+    <p>%s</p>
+    """ % _('Indexing units for searching...')
+    logging.info("Indexing units for searching")
+    for store in Store.objects.filter(state__gte=PARSED).iterator():
+        UnitTrigram.objects.index_units(store.unit_set.all())
+    return text
+
+def update_tm_index_21150():
+    text = u"""
+    <p>%s</p>
+    """ % _('Indexing the translation memory...')
+    logging.info("Indexing the translation memory")
+    for store in Store.objects.filter(state__gte=PARSED).select_related('translation_project').iterator():
+        TMTrigram.objects.index_units(store.unit_set.filter(state__in=(TRANSLATED, OBSOLETE)),
+                                      store.translation_project.language_id)
+    return text
+
 def parse_start():
     text = u"""
     <p>%s</p>
@@ -249,12 +392,51 @@ def staggered_update(db_buildversion, tt_buildversion):
     if db_buildversion < 20030:
         yield update_permissions_20030()
 
+    if db_buildversion < 21120:
+        try:
+            yield create_tables_21120()
+        except Exception, e:
+            logging.warning(u"something broke while creating new database tables:\n%s", e)
+
     if db_buildversion < 21000:
         try:
             yield update_tables_21000()
         except Exception, e:
             logging.warning(u"something broke while upgrading database tables:\n%s", e)
 
+    # columns added after 2.0 have to exist before the upgrade below
+    # loads and saves stores through the ORM
+    if db_buildversion < 21070:
+        try:
+            yield update_tables_21070()
+        except Exception, e:
+            logging.warning(u"something broke while upgrading database tables:\n%s", e)
+
+    if db_buildversion < 21080:
+        try:
+            yield update_tables_21080()
+        except Exception, e:
+            logging.warning(u"something broke while upgrading database tables:\n%s", e)
+
+    if db_buildversion < 21090:
+        try:
+            yield update_tables_21090()
+        except Exception, e:
+            logging.warning(u"something broke while upgrading database tables:\n%s", e)
+
+    if db_buildversion < 21100:
+        try:
+            yield update_tables_21100()
+        except Exception, e:
+            logging.warning(u"something broke while upgrading database tables:\n%s", e)
+
+    if db_buildversion < 21110:
+        try:
+            yield update_tables_21110()
+        except Exception, e:
+            logging.warning(u"something broke while upgrading database tables:\n%s", e)
+
+    if db_buildversion < 21000:
         logging.info("creating project directories")
         Directory.objects.root.get_or_make_subdir('projects')
         for project in Project.objects.iterator():
@@ -292,6 +474,21 @@ def staggered_update(db_buildversion, tt_buildversion):
     if db_buildversion < 21040:
         yield update_qualitychecks_21040()
 
+    if db_buildversion < 21100:
+        yield update_check_masks_21100()
+
+    if db_buildversion < 21110:
+        yield update_suggestion_counts_21110()
+
+    if db_buildversion < 21120:
+        yield update_directory_tree_21120()
+
+    if db_buildversion < 21130:
+        yield update_search_index_21130()
+
+    if db_buildversion < 21150:
+        yield update_tm_index_21150()
+
     if db_buildversion < 21060:
         yield update_stats_21060()
 
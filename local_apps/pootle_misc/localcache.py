@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Zuza Software Foundation
+#
+# This file is part of Pootle.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""per process and per request caches kept in front of the shared
+django cache"""
+
+import copy
+import time
+import threading
+
+from django.conf import settings
+
+class LocalCache(object):
+    """bounded in memory cache with a short expiry time.
+
+    holds at most max_entries values, each for at most timeout
+    seconds. when full the least recently used 1/cull_frequency of the
+    entries are dropped."""
+
+    def __init__(self, max_entries, timeout, cull_frequency=4):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.cull_frequency = cull_frequency
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        self._lock.acquire()
+        try:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    entry[2] = now
+                    self.hits += 1
+                    # callers are free to modify what they get, like
+                    # they are with values unpickled from django's cache
+                    return copy.copy(entry[1])
+                del self._data[key]
+            self.misses += 1
+            return None
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        if self.max_entries <= 0 or value is None:
+            return
+        now = time.time()
+        self._lock.acquire()
+        try:
+            if key not in self._data and len(self._data) >= self.max_entries:
+                self._cull(now)
+            self._data[key] = [now + self.timeout, copy.copy(value), now]
+        finally:
+            self._lock.release()
+
+    def delete_many(self, keys):
+        self._lock.acquire()
+        try:
+            for key in keys:
+                self._data.pop(key, None)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+        finally:
+            self._lock.release()
+
+    def _cull(self, now):
+        for key in [key for key, entry in self._data.iteritems() if entry[0] <= now]:
+            del self._data[key]
+        if len(self._data) >= self.max_entries:
+            entries = sorted(self._data.iteritems(), key=lambda item: item[1][2])
+            for key, entry in entries[:max(len(entries) / self.cull_frequency, 1)]:
+                del self._data[key]
+
+    def get_stats(self):
+        """hit and miss counters since the process started, for tuning
+        LOCAL_CACHE_SIZE and LOCAL_CACHE_TIMEOUT"""
+        return {'entries': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                }
+
+local_cache = LocalCache(settings.LOCAL_CACHE_SIZE, settings.LOCAL_CACHE_TIMEOUT)
+
+
+class RequestMemo(threading.local):
+    """values looked up while serving the current request, so the same
+    object asked for the same stats several times only hits the cache
+    once.
+
+    only active between start() and finish(), which are called by
+    RequestMemoMiddleware"""
+
+    def __init__(self):
+        self._data = None
+        self.lookups = 0
+        self.deduplicated = 0
+
+    def start(self):
+        self._data = {}
+        self.lookups = 0
+        self.deduplicated = 0
+
+    def finish(self):
+        self._data = None
+
+    def get(self, path, name):
+        if self._data is None:
+            return None
+        self.lookups += 1
+        try:
+            value = self._data[path][name]
+        except KeyError:
+            return None
+        self.deduplicated += 1
+        return copy.copy(value)
+
+    def set(self, path, name, value):
+        if self._data is not None:
+            self._data.setdefault(path, {})[name] = copy.copy(value)
+
+    def forget(self, paths):
+        if self._data is not None:
+            for path in paths:
+                self._data.pop(path, None)
+
+request_memo = RequestMemo()
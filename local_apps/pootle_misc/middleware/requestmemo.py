@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Zuza Software Foundation
+#
+# This file is part of Pootle.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+from pootle_misc.localcache import request_memo
+
+class RequestMemoMiddleware(object):
+    """remember cached stats for the duration of a request"""
+
+    def process_request(self, request):
+        request_memo.start()
+
+    def process_response(self, request, response):
+        if request_memo.lookups:
+            logging.debug(u"%d of %d cached lookups deduplicated for %s",
+                          request_memo.deduplicated, request_memo.lookups, request.path)
+        request_memo.finish()
+        return response
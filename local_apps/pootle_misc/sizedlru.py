@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Zuza Software Foundation
+#
+# This file is part of Pootle.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""least recently used cache bounded by the estimated memory used by
+its values"""
+
+import os
+import time
+import threading
+
+class SizedLRUDict(object):
+    """dictionary keeping at most maxsize entries whose estimated sizes
+    add up to at most maxbytes, least recently used entries are evicted
+    first.
+
+    the most recently added entry is always kept, even if it alone is
+    bigger than maxbytes."""
+
+    default_size = 64 * 1024
+    """size assumed for entries added without an estimate"""
+
+    def __init__(self, maxsize, maxbytes, name=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.name = name
+        self.evictions = 0
+        self.created = time.time()
+        self._data = {}
+        self._tick = 0
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._data[key]
+            self._tick += 1
+            entry[2] = self._tick
+            return entry[0]
+        finally:
+            self._lock.release()
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, size=None):
+        if size is None:
+            size = self.default_size
+        self._lock.acquire()
+        try:
+            if key in self._data:
+                self._bytes -= self._data[key][1]
+            self._tick += 1
+            self._data[key] = [value, size, self._tick]
+            self._bytes += size
+            self._evict(key)
+        finally:
+            self._lock.release()
+
+    def resize(self, key, size):
+        """update the size estimate of an entry whose value grew or
+        shrank"""
+        self._lock.acquire()
+        try:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._bytes += size - entry[1]
+                entry[1] = size
+                self._evict(key)
+        finally:
+            self._lock.release()
+
+    def __delitem__(self, key):
+        self._lock.acquire()
+        try:
+            entry = self._data.pop(key)
+            self._bytes -= entry[1]
+        finally:
+            self._lock.release()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def items(self):
+        self._lock.acquire()
+        try:
+            return [(key, entry[0]) for key, entry in self._data.iteritems()]
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._data.clear()
+            self._bytes = 0
+        finally:
+            self._lock.release()
+
+    def _evict(self, keep):
+        if len(self._data) <= self.maxsize and self._bytes <= self.maxbytes:
+            return
+        entries = sorted(self._data.iteritems(), key=lambda item: item[1][2])
+        for key, entry in entries:
+            if len(self._data) <= self.maxsize and self._bytes <= self.maxbytes:
+                break
+            if key == keep:
+                continue
+            del self._data[key]
+            self._bytes -= entry[1]
+            self.evictions += 1
+
+    def get_stats(self):
+        """report on memory use for the admin dashboard"""
+        hours = max((time.time() - self.created) / 3600, 1.0 / 60)
+        return {'name': self.name,
+                'pid': os.getpid(),
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'maxbytes': self.maxbytes,
+                'evictions': self.evictions,
+                'evictions_per_hour': int(self.evictions / hours),
+                }
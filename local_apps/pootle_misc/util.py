@@ -19,6 +19,7 @@
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import time
 
 from django.core.cache import cache
 from django.conf import settings
@@ -26,40 +27,93 @@ from django.core.paginator import Paginator
 from django.utils.encoding import iri_to_uri
 from django.http import HttpResponseBadRequest
 
+from pootle_misc.localcache import local_cache, request_memo
+
+def _generation_key(path):
+    return "generation:" + path
+
+def get_generation(path):
+    """current generation of cached values for path.
+
+    generations start from the current time in microseconds, so a
+    counter that expired or got culled never returns to a number that
+    still has values stored under it"""
+    key = _generation_key(path)
+    generation = local_cache.get(key)
+    if generation is None:
+        generation = cache.get(key)
+        if generation is None:
+            cache.add(key, _new_generation(), settings.OBJECT_CACHE_TIMEOUT)
+            # read back, another process may have added it first
+            generation = cache.get(key)
+            if generation is None:
+                return _new_generation()
+        local_cache.set(key, generation)
+    return generation
+
+def _new_generation():
+    return int(time.time() * 1000000)
+
 def getfromcache(function, timeout=settings.OBJECT_CACHE_TIMEOUT):
     def _getfromcache(instance, *args, **kwargs):
-        key = iri_to_uri(instance.pootle_path + ":" + function.__name__)
-        result = cache.get(key)
+        result = request_memo.get(instance.pootle_path, function.__name__)
+        if result is not None:
+            return result
+        path = iri_to_uri(instance.pootle_path)
+        key = "%s:%d:%s" % (path, get_generation(path), function.__name__)
+        result = local_cache.get(key)
         if result is None:
-            logging.debug(u"cache miss for %s", key)
-            result = function(instance, *args, **kwargs)
-            cache.set(key, result, timeout)
+            result = cache.get(key)
+            if result is None:
+                logging.debug(u"cache miss for %s", key)
+                result = function(instance, *args, **kwargs)
+                cache.set(key, result, timeout)
+            local_cache.set(key, result)
+        request_memo.set(instance.pootle_path, function.__name__, result)
         return result
     return _getfromcache
 
-def deletefromcache(sender, functions, **kwargs):
-    path = iri_to_uri(sender.pootle_path)
+def _invalidated_paths(path):
+    """paths whose cached values depend on path: path itself, all its
+    ancestors and the project it belongs to"""
     path_parts = path.split("/")
-
-    # clean project cache
-    if len(path_parts):
-        key = "/projects/%s/" % path_parts[2]
-        for func in functions:
-            cache.delete(key + ":" + func)
-
-    # clean store and directory cache
+    paths = []
+    if len(path_parts) > 2 and path_parts[2]:
+        paths.append("/projects/%s/" % path_parts[2])
     while path_parts:
-        for func in functions:
-            cache.delete(path + ":"+func)
+        if path not in paths:
+            paths.append(path)
         path_parts = path_parts[:-1]
         path = "/".join(path_parts) + "/"
+    return paths
+
+def deletefromcache(sender, functions, **kwargs):
+    """invalidate cached values of sender and everything containing it
+    by bumping their generation counters, values stored under older
+    generations are never read again and age out of the cache.
+
+    all cached functions of the affected paths are invalidated, not
+    only those listed in functions.
+
+    other processes keep using the old generation from their local
+    cache for at most LOCAL_CACHE_TIMEOUT seconds"""
+    request_memo.forget(_invalidated_paths(sender.pootle_path))
+    keys = [_generation_key(path) for path in _invalidated_paths(iri_to_uri(sender.pootle_path))]
+    local_cache.delete_many(keys)
+    # a fresh generation is newer than any the keys had, so concurrent
+    # bumps can't undo each other and nothing has to be read first
+    generation = _new_generation()
+    cache.set_many(dict((key, generation) for key in keys), settings.OBJECT_CACHE_TIMEOUT)
 
 def dictsum(x, y):
     return dict((n, x.get(n, 0)+y.get(n, 0)) for n in set(x)|set(y))
 
 
-def paginate(request, queryset, items=30, page=None):
+def paginate(request, queryset, items=30, page=None, count=None):
     paginator = Paginator(queryset, items)
+    if count is not None:
+        # length already known, spare the COUNT query
+        paginator._count = count
 
     if not page:
         try:
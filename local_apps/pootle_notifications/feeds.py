@@ -61,7 +61,7 @@ class NoticeFeed(Feed):
 
     def items(self, directory):
         if self.recusrive:
-            return Notice.objects.filter(directory__pootle_path__startswith=directory.pootle_path).select_related('directory')[:30]
+            return Notice.objects.filter(directory__ancestor_links__ancestor=directory).select_related('directory')[:30]
         else:
             return Notice.objects.filter(directory=directory).select_related('directory')[:30]
 
@@ -53,7 +53,7 @@ def view(request, path):
         template_vars['form'] = handle_form(request, directory)
         template_vars['title'] = directory_to_title(request, directory)
     if request.GET.get('all', False):
-        template_vars['notices'] = Notice.objects.filter(directory__pootle_path__startswith=directory.pootle_path).select_related('directory')[:30]
+        template_vars['notices'] = Notice.objects.filter(directory__ancestor_links__ancestor=directory).select_related('directory')[:30]
     else:
         template_vars['notices'] = Notice.objects.filter(directory=directory).select_related('directory')[:30]
 
@@ -28,13 +28,14 @@ from django.core.exceptions import ObjectDoesNotExist
 from translate.filters import checks
 from translate.lang.data import langcode_re
 
-from pootle_store.util import absolute_real_path, statssum
+from pootle_store.util import absolute_real_path
 from pootle_misc.aggregate import max_column
-from pootle_store.models import Unit
+from pootle_store.models import Store, Unit, rollup_stats
 from pootle_store.filetypes import filetype_choices, factory_classes, is_monolingual
-from pootle_misc.util import getfromcache
+from pootle_misc.util import getfromcache, deletefromcache
 from pootle_misc.baseurl import l
 from pootle_app.lib.util import RelatedManager
+from pootle_statistics.models import PathStats
 
 class ProjectManager(RelatedManager):
     def get_by_natural_key(self, code):
@@ -86,20 +87,53 @@ class Project(models.Model):
         from pootle_app.models.directory import Directory
         self.directory = Directory.objects.projects.get_or_make_subdir(self.code)
 
+        source_language_changed = self.id is not None and \
+            not Project.objects.filter(id=self.id, source_language=self.source_language_id).exists()
         super(Project, self).save(*args, **kwargs)
 
+        if source_language_changed:
+            # a different translation project is now left out of the stats
+            self.forget_template_translationproject()
+            languages = [tp.language for tp in self.translationproject_set.select_related('language').iterator()]
+            PathStats.objects.forget([self.pootle_path] + [language.pootle_path for language in languages])
+            for obj in [self] + languages:
+                deletefromcache(obj, ["getquickstats", "get_mtime"])
+
     def delete(self, *args, **kwargs):
         directory = self.directory
+        translation_projects = list(self.translationproject_set.select_related('language').iterator())
         super(Project, self).delete(*args, **kwargs)
         directory.delete()
+        PathStats.objects.forget([self.pootle_path])
+        for translation_project in translation_projects:
+            PathStats.objects.forget([translation_project.language.pootle_path],
+                                     prefix=translation_project.pootle_path)
+            deletefromcache(translation_project.language, ["getquickstats", "get_mtime"])
+        deletefromcache(self, ["getquickstats", "get_mtime", "get_template_translationproject_id"])
+
+    def get_rollup(self):
+        """stats rollup of all translation projects of this project"""
+        return PathStats.objects.get_rollup(self.pootle_path,
+                                            lambda: rollup_stats(self._get_rollup_stores()),
+                                            self._calculate_mtime)
+
+    def _get_rollup_stores(self):
+        """stores whose stats are aggregated in the rollup, template
+        translation projects are left out"""
+        translation_projects = [translation_project.id for translation_project in self.translationproject_set.iterator()
+                                if not translation_project.is_template_project]
+        return Store.objects.filter(translation_project__in=translation_projects)
+
+    def _calculate_mtime(self):
+        return max_column(Unit.objects.filter(store__translation_project__project=self), 'mtime', None)
 
     @getfromcache
     def get_mtime(self):
-        return max_column(Unit.objects.filter(store__translation_project__project=self), 'mtime', None)
+        return self.get_rollup().mtime
 
     @getfromcache
     def getquickstats(self):
-        return statssum(self.translationproject_set.iterator())
+        return self.get_rollup().get_quickstats()
 
     def translated_percentage(self):
         return int(100.0 * self.getquickstats()['translatedsourcewords'] / max(self.getquickstats()['totalsourcewords'], 1))
@@ -178,6 +212,15 @@ class Project(models.Model):
         # when unsure return nongnu
         return "nongnu"
 
+    @getfromcache
+    def get_template_translationproject_id(self):
+        template_translationproject = self.get_template_translationproject()
+        if template_translationproject is not None:
+            return template_translationproject.id
+
+    def forget_template_translationproject(self):
+        deletefromcache(self, ["get_template_translationproject_id"])
+
     def get_template_translationproject(self):
         try:
             return self.translationproject_set.get(language__code='templates')
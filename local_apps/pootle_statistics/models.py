@@ -19,9 +19,12 @@
 # along with translate; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
-from django.db                import models
+from django.db                import models, IntegrityError
+from django.db.models import F, Q
+from django.db.transaction import commit_on_success, savepoint, savepoint_commit, savepoint_rollback
 
 from pootle_app.lib.util import RelatedManager
+from pootle_store.util import empty_quickstats, empty_completestats, quickstats_keys
 
 class Submission(models.Model):
     class Meta:
@@ -38,3 +41,148 @@ class Submission(models.Model):
 
     def __unicode__(self):
         return u"%s (%s)" % (self.creation_time.strftime("%Y-%m-%d %H:%M"), unicode(self.submitter))
+
+
+class PathStatsManager(models.Manager):
+    def get_rollup(self, pootle_path, calculate_quickstats, calculate_mtime):
+        """return rollup for pootle_path, calculating it from scratch
+        if it doesn't exist yet"""
+        try:
+            return self.get(pootle_path=pootle_path)
+        except PathStats.DoesNotExist:
+            return self._create_rollup(pootle_path, calculate_quickstats, calculate_mtime)
+
+    @commit_on_success
+    def _create_rollup(self, pootle_path, calculate_quickstats, calculate_mtime):
+        """seed a new rollup in the same transaction that stores it,
+        so changes to its stores are either counted or applied"""
+        pathstats = PathStats(pootle_path=pootle_path, mtime=calculate_mtime())
+        pathstats.set_quickstats(calculate_quickstats())
+        sid = savepoint()
+        try:
+            pathstats.save()
+            savepoint_commit(sid)
+        except IntegrityError:
+            # somebody else calculated it in the meantime
+            savepoint_rollback(sid)
+            return self.get(pootle_path=pootle_path)
+        return pathstats
+
+    def update_stats(self, pootle_paths, delta, mtime=None):
+        """apply a change in store stats to all rollups in
+        pootle_paths with a single query"""
+        if not pootle_paths:
+            return
+        if delta:
+            updates = dict((key, F(key) + value) for key, value in delta.iteritems())
+            self.filter(pootle_path__in=pootle_paths).update(**updates)
+        if mtime is not None:
+            self.filter(Q(mtime__lt=mtime) | Q(mtime__isnull=True),
+                        pootle_path__in=pootle_paths).update(mtime=mtime)
+
+    def update_checks(self, pootle_paths, delta):
+        """apply a change in failing quality checks to all rollups in
+        pootle_paths that have their checks calculated"""
+        if not pootle_paths or not delta:
+            return
+        paths = list(self.filter(pootle_path__in=pootle_paths, checks_valid=True).values_list('pootle_path', flat=True))
+        if not paths:
+            return
+        for name, value in delta.iteritems():
+            if not value:
+                continue
+            checks = PathCheckStats.objects.filter(pootle_path__in=paths, name=name)
+            existing = set(checks.values_list('pootle_path', flat=True))
+            if existing:
+                checks.update(count=F('count') + value)
+            for pootle_path in paths:
+                if pootle_path not in existing:
+                    PathCheckStats.objects.create(pootle_path=pootle_path, name=name, count=value)
+
+    def invalidate_checks(self):
+        """mark all check rollups as stale, they will be recalculated
+        on demand"""
+        self.filter(checks_valid=True).update(checks_valid=False)
+
+    def forget(self, pootle_paths=(), prefix=None):
+        """drop rollups of pootle_paths and of every path under prefix,
+        they will be recalculated on demand"""
+        query = Q(pootle_path__in=list(pootle_paths))
+        if prefix is not None:
+            query = query | Q(pootle_path__startswith=prefix)
+        self.filter(query).delete()
+        PathCheckStats.objects.filter(query).delete()
+
+
+class PathStats(models.Model):
+    """aggregated quickstats, completestats and last modification time
+    of all stores under a Directory, TranslationProject, Language or
+    Project.
+
+    rollups are created on first read and then kept up to date by
+    stores, which propagate their changes to every ancestor."""
+    objects = PathStatsManager()
+
+    pootle_path = models.CharField(max_length=255, null=False, unique=True, db_index=True)
+    total = models.IntegerField(default=0)
+    totalsourcewords = models.IntegerField(default=0)
+    untranslated = models.IntegerField(default=0)
+    untranslatedsourcewords = models.IntegerField(default=0)
+    fuzzy = models.IntegerField(default=0)
+    fuzzysourcewords = models.IntegerField(default=0)
+    translated = models.IntegerField(default=0)
+    translatedsourcewords = models.IntegerField(default=0)
+    translatedtargetwords = models.IntegerField(default=0)
+    suggestions = models.IntegerField(default=0)
+    mtime = models.DateTimeField(null=True)
+    checks_valid = models.BooleanField(default=False)
+    """have completestats been calculated for this path"""
+
+    def __unicode__(self):
+        return self.pootle_path
+
+    def get_quickstats(self):
+        stats = {}
+        stats.update(empty_quickstats)
+        for key in quickstats_keys:
+            stats[key] = getattr(self, key)
+        return stats
+
+    def set_quickstats(self, stats):
+        for key in quickstats_keys:
+            setattr(self, key, stats.get(key, 0))
+
+    def get_completestats(self, calculate_completestats):
+        if not self.checks_valid:
+            self.refresh_completestats(calculate_completestats)
+        stats = {}
+        stats.update(empty_completestats)
+        stats.update(PathCheckStats.objects.filter(pootle_path=self.pootle_path).values_list('name', 'count'))
+        return stats
+
+    @commit_on_success
+    def refresh_completestats(self, calculate_completestats):
+        """recalculate the check rollups in the same transaction that
+        marks them valid"""
+        self.set_completestats(calculate_completestats())
+
+    def set_completestats(self, stats):
+        PathCheckStats.objects.filter(pootle_path=self.pootle_path).delete()
+        for name, count in stats.iteritems():
+            if name != 'errors' and count:
+                PathCheckStats.objects.create(pootle_path=self.pootle_path, name=name, count=count)
+        self.checks_valid = True
+        PathStats.objects.filter(id=self.id).update(checks_valid=True)
+
+
+class PathCheckStats(models.Model):
+    """number of failing units per quality check under pootle_path"""
+    class Meta:
+        unique_together = ('pootle_path', 'name')
+
+    pootle_path = models.CharField(max_length=255, null=False, db_index=True)
+    name = models.CharField(max_length=64, null=False)
+    count = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return u"%s:%s" % (self.pootle_path, self.name)
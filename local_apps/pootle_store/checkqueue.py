@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Zuza Software Foundation
+#
+# This file is part of Pootle.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""background quality checks for BACKGROUND_QUALITYCHECKS"""
+
+import os
+import logging
+import threading
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils.encoding import iri_to_uri
+
+CLAIM_TIMEOUT = 10 * 60
+"""seconds another process waits before taking over a store whose
+checks were claimed by a process that went away"""
+
+def check_store(store):
+    """run pending quality checks of store, unless another process is
+    already checking it. returns True if the store got checked"""
+    from pootle_store.models import PARSED, CHECKED
+
+    key = iri_to_uri("%s:checking" % store.pootle_path)
+    if not cache.add(key, os.getpid(), CLAIM_TIMEOUT):
+        return False
+    try:
+        if PARSED <= store.state < CHECKED:
+            logging.debug(u"Running queued quality checks for %s", store.pootle_path)
+            store.update_qualitychecks()
+        return True
+    finally:
+        cache.delete(key)
+
+
+class CheckQueue(object):
+    """stores waiting for their quality checks, worked through in the
+    order they were queued by a background thread that is started
+    when the first store gets queued."""
+
+    def __init__(self):
+        self._pending = []
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.current = None
+        self.done = 0
+
+    def schedule(self, store):
+        self._lock.acquire()
+        try:
+            if store.id in self._queued:
+                return
+            self._queued.add(store.id)
+            self._pending.append(store.id)
+            self._wakeup.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pootle-checks")
+                self._thread.setDaemon(True)
+                self._thread.start()
+        finally:
+            self._lock.release()
+
+    def _next(self):
+        self._lock.acquire()
+        try:
+            if not self._pending:
+                self._wakeup.clear()
+                return None
+            store_id = self._pending.pop(0)
+            self._queued.discard(store_id)
+            self.current = store_id
+            return store_id
+        finally:
+            self._lock.release()
+
+    def _run(self):
+        from pootle_store.models import Store
+
+        while True:
+            self._wakeup.wait()
+            store_id = self._next()
+            while store_id is not None:
+                try:
+                    store = Store.objects.get(id=store_id)
+                    if check_store(store):
+                        self.done += 1
+                except Store.DoesNotExist:
+                    pass
+                except Exception, e:
+                    logging.error(u"Failed to run quality checks of store %d:\n%s", store_id, e)
+                self.current = None
+                store_id = self._next()
+            # don't hold on to a database connection while waiting
+            connection.close()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def get_stats(self):
+        """progress of this process's queue for the admin dashboard"""
+        return {'pid': os.getpid(),
+                'queued': len(self._pending),
+                'current': self.current,
+                'done': self.done,
+                }
+
+check_queue = CheckQueue()
@@ -29,12 +29,14 @@ from django.conf import settings
 from django.db import models
 from django.db.models.fields.files import FieldFile, FileField
 
-from translate.storage import factory
-from translate.misc.lru import LRUCachingDict
+from translate.storage import factory, po
 from translate.misc.multistring import multistring
 
 from pootle_store.signals import translation_file_updated
+from pootle_misc.sizedlru import SizedLRUDict
 from pootle_store.filetypes import factory_classes
+from pootle_store import parsecache
+from pootle_store.watcher import FileWatcher
 
 ################# String #############################
 
@@ -105,20 +107,71 @@ class MultiStringField(models.Field):
 ################# File ###############################
 
 
+STORE_MEMORY_FACTOR = 10
+"""parsed stores take roughly this many times their file size in memory"""
+
 class StoreTuple(object):
-    """Encapsulates toolkit stores in the in memory cache, needed
-    since LRUCachingDict is based on a weakref.WeakValueDictionary
-    which cannot reference normal tuples"""
+    """Encapsulates toolkit stores in the in memory cache together
+    with what we know about the file they were read from"""
     def __init__(self, store, mod_info, realpath):
         self.store = store
         self.mod_info = mod_info
         self.realpath = realpath
+        self.layout = None
+        """byte ranges of the units in the file, see scan_po_layout"""
+
+def scan_po_layout(path):
+    """byte ranges of the blank line separated blocks of a PO file,
+    each unit (including the header and obsolete units) is one block"""
+    layout = []
+    start = None
+    end = offset = 0
+    pofile = open(path, 'rb')
+    try:
+        for line in pofile:
+            if line.strip():
+                if start is None:
+                    start = offset
+                end = offset + len(line)
+            elif start is not None:
+                layout.append((start, end))
+                start = None
+            offset += len(line)
+    finally:
+        pofile.close()
+    if start is not None:
+        layout.append((start, end))
+    return layout
+
+def _po_source_lines(block):
+    """msgctxt and msgid lines of a serialized PO unit, used to make
+    sure a block of the file belongs to the unit replacing it"""
+    lines = []
+    in_source = False
+    for line in block.splitlines():
+        if line.startswith('#~ '):
+            line = line[3:]
+        if line.startswith('msgctxt') or line.startswith('msgid'):
+            in_source = True
+        elif line.startswith('msgstr') or line.startswith('#'):
+            in_source = False
+        if in_source:
+            lines.append(line.strip())
+    return lines
+
+def _copy_span(source, destination, length, chunk_size=64*1024):
+    while length > 0:
+        data = source.read(min(chunk_size, length))
+        if not data:
+            break
+        destination.write(data)
+        length -= len(data)
 
 class TranslationStoreFieldFile(FieldFile):
     """FieldFile is the File-like object of a FileField, that is found in a
     TranslationStoreField."""
 
-    _store_cache = LRUCachingDict(settings.PARSE_POOL_SIZE, settings.PARSE_POOL_CULL_FREQUENCY)
+    _store_cache = SizedLRUDict(settings.PARSE_POOL_SIZE, settings.PARSE_POOL_MEMORY, name="parsed files")
 
     def getpomtime(self):
         file_stat = os.stat(self.realpath)
@@ -151,6 +204,18 @@ class TranslationStoreFieldFile(FieldFile):
     def _update_store_cache(self):
         """Add translation store to dictionary cache, replace old cached
         version if needed."""
+        if settings.WATCH_TRANSLATION_FILES and (file_watcher.active or file_watcher.start(settings.PODIRECTORY)):
+            try:
+                store_tuple = self._store_cache[self.path]
+            except KeyError:
+                pass
+            else:
+                if file_watcher.is_fresh(store_tuple.realpath):
+                    # no need to stat files the watcher knows didn't change
+                    self._store_tuple = store_tuple
+                    return
+                file_watcher.forget(store_tuple.realpath)
+
         mod_info = self.getpomtime()
         if not hasattr(self, "_store_typle") or self._store_tuple.mod_info != mod_info:
             try:
@@ -160,9 +225,12 @@ class TranslationStoreFieldFile(FieldFile):
                     raise KeyError
             except KeyError:
                 logging.debug(u"cache miss for %s", self.path)
-                self._store_tuple = StoreTuple(factory.getobject(self.path, ignore=self.field.ignore, classes=factory_classes),
-                                               mod_info, self.realpath)
-                self._store_cache[self.path] = self._store_tuple
+                store = parsecache.load(self.path, mod_info)
+                if store is None:
+                    store = factory.getobject(self.path, ignore=self.field.ignore, classes=factory_classes)
+                    parsecache.save(self.path, mod_info, store)
+                self._store_tuple = StoreTuple(store, mod_info, self.realpath)
+                self._store_cache.set(self.path, self._store_tuple, mod_info[1] * STORE_MEMORY_FACTOR)
                 translation_file_updated.send(sender=self, path=self.path)
 
 
@@ -184,6 +252,7 @@ class TranslationStoreFieldFile(FieldFile):
             del self._store_cache[self.path]
         except KeyError:
             pass
+        parsecache.delete(self.path)
 
         try:
             del self._store_tuple
@@ -194,14 +263,75 @@ class TranslationStoreFieldFile(FieldFile):
 
     store = property(_get_store)
 
-    def savestore(self):
+    def savestore(self, changed_units=None):
         """Saves to temporary file then moves over original file. This
-        way we avoid the need for locking."""
+        way we avoid the need for locking.
+
+        changed_units lists the toolkit units modified since the file
+        was last read or written. when given, PO files are patched by
+        copying the file and reserializing only those units and the
+        header."""
         tmpfile, tmpfilename = tempfile.mkstemp(suffix=self.filename)
         os.close(tmpfile)
-        self.store.savefile(tmpfilename)
+        layout = None
+        if changed_units is not None:
+            layout = self._patch_po(tmpfilename, changed_units)
+        if layout is None:
+            self.store.savefile(tmpfilename)
         shutil.move(tmpfilename, self.realpath)
         self._touch_store_cache()
+        self._store_tuple.layout = layout
+
+    def _patch_po(self, tmpfilename, changed_units):
+        """write the file with changed_units replaced to tmpfilename,
+        returns the new layout or None if the file can't be patched
+        because it isn't a PO file or its structure changed"""
+        store = self.store
+        if not isinstance(store, po.pofile):
+            return None
+        layout = self._store_tuple.layout
+        if layout is None:
+            layout = scan_po_layout(self.realpath)
+        if len(layout) != len(store.units):
+            return None
+
+        changed_units = list(changed_units)
+        header = store.header()
+        if header is not None:
+            changed_units.append(header)
+        unit_index = dict((id(unit), index) for index, unit in enumerate(store.units))
+        replacements = {}
+        for unit in changed_units:
+            index = unit_index.get(id(unit))
+            if index is None:
+                return None
+            replacements[index] = str(unit).rstrip('\n') + '\n'
+
+        new_layout = []
+        shift = 0
+        position = 0
+        source = open(self.realpath, 'rb')
+        destination = open(tmpfilename, 'wb')
+        try:
+            for index, (start, end) in enumerate(layout):
+                if index not in replacements:
+                    new_layout.append((start + shift, end + shift))
+                    continue
+                _copy_span(source, destination, start - position)
+                old_block = source.read(end - start)
+                position = end
+                text = replacements[index]
+                if _po_source_lines(old_block) != _po_source_lines(text):
+                    logging.debug(u"unit %d of %s moved, saving whole file", index, self.path)
+                    return None
+                destination.write(text)
+                new_layout.append((start + shift, start + shift + len(text)))
+                shift += len(text) - (end - start)
+            shutil.copyfileobj(source, destination)
+        finally:
+            source.close()
+            destination.close()
+        return new_layout
 
     def save(self, name, content, save=True):
         #FIXME: implement save to tmp file then move instead of directly saving
@@ -214,6 +344,33 @@ class TranslationStoreFieldFile(FieldFile):
             super(TranslationStoreFieldFile, self).delete(save)
 
 
+def _file_changed(realpath):
+    """called from the file watcher thread when a file under PODIRECTORY
+    changed, realpath is None if any file might have changed"""
+    cached = TranslationStoreFieldFile._store_cache.items()
+    if realpath is None:
+        for path, store_tuple in cached:
+            file_watcher.mark_stale(store_tuple.realpath)
+        return
+
+    for path, store_tuple in cached:
+        if store_tuple.realpath == realpath:
+            try:
+                file_stat = os.stat(realpath)
+                mod_info = file_stat.st_mtime, file_stat.st_size
+            except OSError:
+                mod_info = None
+            if mod_info == store_tuple.mod_info:
+                # we saved it ourselves
+                return
+            break
+    else:
+        path = realpath
+    translation_file_updated.send(sender=TranslationStoreFieldFile, path=path)
+
+file_watcher = FileWatcher(_file_changed)
+
+
 class TranslationStoreField(FileField):
     """This is the field class to represent a FileField in a model that
     represents a translation store."""
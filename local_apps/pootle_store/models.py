@@ -23,30 +23,35 @@ import logging
 import re
 import datetime
 
-from django.db import models, IntegrityError
+from django.db import models, connection, IntegrityError
+from django.db.models import F
 from django.core.cache import cache
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 from django.core.files.storage import FileSystemStorage
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.transaction import commit_on_success
+from django.db.transaction import commit_on_success, savepoint, savepoint_commit, savepoint_rollback
 from django.utils.encoding import iri_to_uri
 
 from translate.storage import base, statsdb, po, poheader
 from translate.misc.hash import md5_f
-from translate.search import match
+from translate.search import lshtein
 
 from pootle.__version__ import sver as pootle_version
 
 from pootle_app.lib.util import RelatedManager
 from pootle_misc.util import getfromcache, deletefromcache
-from pootle_misc.aggregate import group_by_count, max_column
+from pootle_misc.aggregate import group_by_count, max_column, sum_column, count_flags
+from pootle_misc.bulk import bulk_insert, bulk_delete
 from pootle_misc.baseurl import l
 
 from pootle_store.fields  import TranslationStoreField, MultiStringField, PLURAL_PLACEHOLDER
-from pootle_store.util import calculate_stats, empty_quickstats
+from pootle_store.util import calculate_stats, empty_quickstats, quickstats_keys, unit_stats, stats_delta
+from pootle_store.util import unit_fingerprint, unit_search_texts, text_trigrams, SEARCH_FIELDS
 from pootle_store.util import OBSOLETE, UNTRANSLATED, FUZZY, TRANSLATED
 from pootle_store.filetypes import factory_classes, is_monolingual
+from pootle_store.syncqueue import sync_queue
+from pootle_statistics.models import PathStats
 
 # Store States
 LOCKED = -1
@@ -71,6 +76,342 @@ class QualityCheck(models.Model):
     def __unicode__(self):
         return self.name
 
+MAX_CHECK_BITS = 63
+"""bits available in Unit.check_mask, signed 64 bit integer"""
+
+class QualityCheckNameManager(models.Manager):
+    # bits are never reassigned, so they can be kept for the lifetime
+    # of the process
+    _bits = {}
+
+    def _load(self):
+        self._bits.update(self.values_list('name', 'bit'))
+
+    def get_bit(self, name):
+        """bit of check name in Unit.check_mask, registering names seen
+        for the first time. None if all bits are taken"""
+        if name not in self._bits:
+            self._load()
+        while name not in self._bits:
+            count = self.count()
+            if count < MAX_CHECK_BITS:
+                bit = count
+            else:
+                bit = None
+            sid = savepoint()
+            try:
+                self.create(name=name, bit=bit)
+                savepoint_commit(sid)
+            except IntegrityError:
+                # another process registered this name or took the
+                # bit in the meantime, look again
+                savepoint_rollback(sid)
+            self._load()
+        return self._bits[name]
+
+    def get_mask(self, names):
+        mask = 0
+        for name in names:
+            bit = self.get_bit(name)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def get_bits(self):
+        """returns a dictionary of check names with a bit and their
+        bit, and a list of check names without one"""
+        self._load()
+        bits = {}
+        unmapped = []
+        for name, bit in self._bits.iteritems():
+            if bit is None:
+                unmapped.append(name)
+            else:
+                bits[name] = bit
+        return bits, unmapped
+
+class QualityCheckName(models.Model):
+    """registry of check names and their bit in Unit.check_mask"""
+    objects = QualityCheckNameManager()
+    name = models.CharField(max_length=64, unique=True)
+    bit = models.IntegerField(null=True, unique=True)
+
+    def __unicode__(self):
+        return self.name
+
+def filter_failing_checks(units_queryset, names):
+    """narrow units_queryset to units failing any of the checks in
+    names"""
+    bits, unmapped = QualityCheckName.objects.get_bits()
+    mask = 0
+    for name in names:
+        if name in bits:
+            mask |= 1 << bits[name]
+    queryset = units_queryset.none()
+    if mask:
+        qn = connection.ops.quote_name
+        queryset = units_queryset.extra(where=["%s.%s & %%s <> 0" % (qn(Unit._meta.db_table), qn('check_mask'))],
+                                        params=[mask])
+    unmapped = [name for name in names if name in unmapped]
+    if unmapped:
+        queryset = queryset | units_queryset.filter(qualitycheck__false_positive=False,
+                                                    qualitycheck__name__in=unmapped).distinct()
+    return queryset
+
+def calculate_check_stats(units):
+    """number of units failing each quality check among the
+    translated and fuzzy units of units queryset"""
+    bits, unmapped = QualityCheckName.objects.get_bits()
+    flags = dict((name, 1 << bit) for name, bit in bits.iteritems())
+    units = units.filter(state__gt=UNTRANSLATED)
+    stats = count_flags(units.exclude(check_mask=0), 'check_mask', flags)
+    if unmapped:
+        queryset = QualityCheck.objects.filter(unit__in=units, false_positive=False, name__in=unmapped)
+        stats.update(group_by_count(queryset, 'name'))
+    return stats
+
+################# Search Index ################
+
+class UnitTrigramManager(models.Manager):
+    def index_units(self, units, batch_size=500):
+        """replace the trigrams of units with those of their current
+        texts"""
+        if hasattr(units, 'iterator'):
+            units = units.iterator()
+        batch = []
+        for unit in units:
+            batch.append(unit)
+            if len(batch) == batch_size:
+                self._index_batch(batch)
+                batch = []
+        self._index_batch(batch)
+
+    def _index_batch(self, units):
+        if not units:
+            return
+        bulk_delete(UnitTrigram, 'unit_id', [unit.id for unit in units])
+        trigrams = []
+        for unit in units:
+            trigrams.extend(self._make_trigrams(unit.id, unit_search_texts(unit)))
+        bulk_insert(UnitTrigram, trigrams)
+
+    def index_fields(self, unit_id, texts):
+        """replace the trigrams of unit_id in the search fields of
+        texts, a dictionary of field codes and their current text,
+        leaving the other fields alone"""
+        if not texts:
+            return
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        cursor.execute("DELETE FROM %s WHERE %s = %%s AND %s IN (%s)" % \
+                       (qn(UnitTrigram._meta.db_table), qn('unit_id'), qn('field'), ", ".join(["%s"] * len(texts))),
+                       [unit_id] + texts.keys())
+        bulk_insert(UnitTrigram, self._make_trigrams(unit_id, texts))
+
+    def _make_trigrams(self, unit_id, texts):
+        return [UnitTrigram(unit_id=unit_id, field=field, trigram=trigram)
+                for field, text in texts.iteritems() for trigram in text_trigrams(text)]
+
+    def forget_units(self, unit_ids):
+        bulk_delete(UnitTrigram, 'unit_id', unit_ids)
+
+class UnitTrigram(models.Model):
+    """trigrams of the searchable fields of units, maintained as units
+    are saved and used to avoid scanning all units when searching
+    without an external indexer.
+
+    not a foreign key so deleting units doesn't load their trigrams,
+    rows left behind by deleted units never match any unit"""
+    objects = UnitTrigramManager()
+    class Meta:
+        unique_together = ('trigram', 'field', 'unit_id')
+
+    unit_id = models.IntegerField(db_index=True)
+    field = models.SmallIntegerField()
+    """one of SEARCH_FIELDS"""
+    trigram = models.BigIntegerField()
+    """see text_trigrams()"""
+
+def filter_trigrams(units_queryset, field, word):
+    """narrow units_queryset to units having all trigrams of word in
+    the search field, which includes all units containing word"""
+    trigrams = text_trigrams(word)
+    if not trigrams:
+        return units_queryset
+    qn = connection.ops.quote_name
+    where = "%s.%s IN (SELECT %s FROM %s WHERE %s = %%s AND %s IN (%s) GROUP BY %s HAVING COUNT(*) = %%s)" % \
+            (qn(Unit._meta.db_table), qn('id'), qn('unit_id'), qn(UnitTrigram._meta.db_table),
+             qn('field'), qn('trigram'), ", ".join(["%s"] * len(trigrams)), qn('unit_id'))
+    return units_queryset.extra(where=[where], params=[SEARCH_FIELDS[field]] + list(trigrams) + [len(trigrams)])
+
+# Unit change log operations
+UNIT_ADDED = 1
+UNIT_CHANGED = 2
+UNIT_DELETED = 3
+
+_have_indexer = None
+
+def have_indexer():
+    """is an external indexing engine available"""
+    global _have_indexer
+    if _have_indexer is None:
+        from translate.search.indexing import _get_available_indexers
+        _have_indexer = bool(_get_available_indexers())
+    return _have_indexer
+
+class UnitChangeManager(models.Manager):
+    def log(self, unit_ids, translation_project_id, op):
+        """append op on the units with unit_ids to the change log, only
+        kept when there is an indexing engine to read it"""
+        if not have_indexer():
+            return
+        bulk_insert(UnitChange, [UnitChange(unit_id=unit_id, translation_project_id=translation_project_id, op=op)
+                                 for unit_id in unit_ids])
+
+    def get_last_id(self, before=None):
+        """id of the last change, or of the last change logged before
+        time before"""
+        changes = self.order_by('-id')
+        if before is not None:
+            changes = changes.filter(time__lt=before)
+        try:
+            return changes.values_list('id', flat=True)[0]
+        except IndexError:
+            return 0
+
+class UnitChange(models.Model):
+    """append only log of changes to the searchable fields of units,
+    read by the search indexer to update only the affected documents.
+
+    ids increase with every change and serve as the indexer's high
+    water mark"""
+    objects = UnitChangeManager()
+
+    unit_id = models.IntegerField()
+    translation_project_id = models.IntegerField(db_index=True)
+    op = models.SmallIntegerField()
+    """UNIT_ADDED, UNIT_CHANGED or UNIT_DELETED"""
+    time = models.DateTimeField(auto_now_add=True)
+
+class TMTrigramManager(models.Manager):
+    def index_units(self, units, language_id, batch_size=500):
+        """replace the translation memory trigrams of units, which all
+        belong to the language with language_id"""
+        if hasattr(units, 'iterator'):
+            units = units.iterator()
+        batch = []
+        for unit in units:
+            batch.append(unit)
+            if len(batch) == batch_size:
+                self._index_batch(batch, language_id)
+                batch = []
+        self._index_batch(batch, language_id)
+
+    def _index_batch(self, units, language_id):
+        if not units:
+            return
+        bulk_delete(TMTrigram, 'unit_id', [unit.id for unit in units])
+        trigrams = []
+        for unit in units:
+            if unit.in_translation_memory():
+                for trigram in text_trigrams(unit_search_texts(unit)[SEARCH_FIELDS['source']]):
+                    trigrams.append(TMTrigram(language_id=language_id, unit_id=unit.id, trigram=trigram))
+        bulk_insert(TMTrigram, trigrams)
+
+    def forget_units(self, unit_ids):
+        bulk_delete(TMTrigram, 'unit_id', unit_ids)
+
+class TMTrigram(models.Model):
+    """trigrams of the source texts of the translated and obsolete
+    units of each language, the index fuzzy matching looks up
+    translation memory candidates in.
+
+    like UnitTrigram not a foreign key, rows of deleted units never
+    match any unit"""
+    objects = TMTrigramManager()
+    class Meta:
+        unique_together = ('language_id', 'trigram', 'unit_id')
+
+    language_id = models.IntegerField()
+    unit_id = models.IntegerField(db_index=True)
+    trigram = models.BigIntegerField()
+    """see text_trigrams()"""
+
+class TMMatcher(object):
+    """finds translations of similar source texts among the units in the
+    translation memory of a language.
+
+    candidates sharing the most trigrams with a text are looked up in
+    the TMTrigram index, only those are compared with Levenshtein
+    distance. a replacement for translate's match.matcher"""
+
+    def __init__(self, language_id, max_candidates=1, min_similarity=75, max_length=1000, shortlist=20, stores=None):
+        self.language_id = language_id
+        self.stores = stores
+        """queryset of the stores candidates are restricted to, all stores
+        of the language if None"""
+        self.max_candidates = max_candidates
+        self.min_similarity = min_similarity
+        self.shortlist = shortlist
+        self.comparer = lshtein.LevenshteinComparer(max_length)
+
+    max_trigrams = 500
+    """most trigrams of a text looked up"""
+
+    def get_shortlist(self, text, length, exclude=None):
+        """ids of the units with the most trigrams in common with text,
+        skipping units whose source length is too different from
+        length"""
+        trigrams = sorted(text_trigrams(text))[:self.max_trigrams]
+        if not trigrams:
+            return []
+        # texts this similar have at least this many trigrams in common
+        min_shared = max(1, len(trigrams) * self.min_similarity / 200)
+        qn = connection.ops.quote_name
+        where = ["tm.%s = %%s" % qn('language_id'),
+                 "tm.%s IN (%s)" % (qn('trigram'), ", ".join(["%s"] * len(trigrams))),
+                 "u.%s = tm.%s" % (qn('id'), qn('unit_id')),
+                 "u.%s BETWEEN %%s AND %%s" % qn('source_length'),
+                 "u.%s <> %%s" % qn('id')]
+        params = [self.language_id] + trigrams + \
+                 [length * self.min_similarity / 100, length * 100 / self.min_similarity + 1, exclude or 0]
+        if self.stores is not None:
+            stores_sql, stores_params = self.stores.values('id').query.get_compiler(connection=connection).as_sql()
+            where.append("u.%s IN (%s)" % (qn('store_id'), stores_sql))
+            params.extend(stores_params)
+        sql = "SELECT tm.%s FROM %s tm, %s u WHERE %s GROUP BY tm.%s HAVING COUNT(*) >= %%s " \
+              "ORDER BY COUNT(*) DESC LIMIT %d" % \
+              (qn('unit_id'), qn(TMTrigram._meta.db_table), qn(Unit._meta.db_table),
+               " AND ".join(where), qn('unit_id'), self.shortlist)
+        params.append(min_shared)
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+    def matches(self, text, exclude=None):
+        """units with source texts similar to text, most similar first"""
+        return [unit for similarity, unit in self.scored_matches(text, exclude)]
+
+    def scored_matches(self, text, exclude=None):
+        """(similarity, unit) of units with source texts similar to text,
+        most similar first"""
+        # source_length of units is the length of the first string
+        length = len(unicode(text))
+        text = u'\n'.join(getattr(text, 'strings', [text]))
+        candidates = []
+        unit_ids = self.get_shortlist(text, length, exclude)
+        if not unit_ids:
+            return candidates
+        for unit in Unit.objects.filter(id__in=unit_ids).iterator():
+            if not unit.in_translation_memory():
+                continue
+            source = unit_search_texts(unit)[SEARCH_FIELDS['source']]
+            similarity = self.comparer.similarity(text, source, self.min_similarity)
+            if similarity >= self.min_similarity:
+                candidates.append((similarity, unit))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return candidates[:self.max_candidates]
+
 ################# Suggestion ################
 
 class SuggestionManager(RelatedManager):
@@ -137,6 +478,24 @@ class UnitManager(RelatedManager):
     def get_by_natural_key(self, unitid_hash, pootle_path):
         return self.get(unitid_hash=unitid_hash, store__pootle_path=pootle_path)
 
+SNAPSHOT_FIELDS = ('state', 'source_f', 'target_f', 'source_wordcount', 'target_wordcount', 'target_length',
+                   'suggestion_count', 'developer_comment', 'translator_comment', 'locations')
+"""fields of a loaded unit its save() compares against"""
+
+def _snapshot_property(name, calculate):
+    """attribute holding calculate() of the unit as loaded from the
+    database, only calculated if read before being replaced"""
+    def getter(self):
+        if name not in self._snapshots:
+            loaded = Unit.__new__(Unit)
+            loaded.__dict__.update(self._loaded_fields)
+            self._snapshots[name] = calculate(loaded)
+        return self._snapshots[name]
+
+    def setter(self, value):
+        self._snapshots[name] = value
+    return property(getter, setter)
+
 class Unit(models.Model, base.TranslationUnit):
     objects = UnitManager()
     class Meta:
@@ -166,6 +525,14 @@ class Unit(models.Model, base.TranslationUnit):
     state = models.IntegerField(null=False, default=UNTRANSLATED, db_index=True)
 
     mtime = models.DateTimeField(auto_now=True, auto_now_add=True, db_index=True, editable=False)
+    fingerprint = models.CharField(max_length=32, null=True, editable=False)
+    """unit_fingerprint() of the unit, NULL if not known yet"""
+    suggestion_count = models.IntegerField(default=0, db_index=True, editable=False)
+    """number of pending suggestions, kept up to date by
+    add_suggestion(), accept_suggestion() and reject_suggestion()"""
+    check_mask = models.BigIntegerField(default=0, editable=False)
+    """bits of the checks failing for the unit, excluding false
+    positives, see QualityCheckName"""
 
     def natural_key(self):
         return (self.unitid_hash, self.store.pootle_path)
@@ -181,8 +548,32 @@ class Unit(models.Model, base.TranslationUnit):
         self._rich_target = None
         self._target_updated = False
         self._encoding = 'UTF-8'
+        if self.id is not None:
+            self._saved_state = self.state
+            # snapshots are calculated from these when first needed,
+            # most units are never saved
+            self._loaded_fields = dict((name, getattr(self, name)) for name in SNAPSHOT_FIELDS)
+            self._snapshots = {}
+        else:
+            self._saved_state = None
+            self._loaded_fields = None
+            self._snapshots = {'stats': {}, 'search_texts': None, 'tm_source': None}
 
-    def save(self, *args, **kwargs):
+    _saved_stats = _snapshot_property('stats', lambda unit: unit.get_unit_stats())
+    _saved_search_texts = _snapshot_property('search_texts', unit_search_texts)
+    _saved_tm_source = _snapshot_property('tm_source', lambda unit: unit._get_tm_source())
+
+    def in_translation_memory(self):
+        """is the unit's translation used for fuzzy matching"""
+        return self.state == TRANSLATED or (self.state == OBSOLETE and self.target_length > 0)
+
+    def _get_tm_source(self):
+        if self.in_translation_memory():
+            return getattr(self.source_f, 'strings', self.source_f)
+
+    def update_derived_fields(self):
+        """recalculate hashes, word counts, state and fingerprint after
+        source or target changed"""
         if self._source_updated:
             # update source related fields
             self.source_hash = md5_f(self.source_f.encode("utf-8")).hexdigest()
@@ -199,18 +590,82 @@ class Unit(models.Model, base.TranslationUnit):
             elif self.state > FUZZY:
                 self.state = UNTRANSLATED
 
+        self.fingerprint = unit_fingerprint(self)
+
+    def get_unit_stats(self):
+        """contribution of this unit to store stats"""
+        return unit_stats(self.state, self.source_wordcount, self.target_wordcount, self.suggestion_count)
+
+    def _load_counters(self):
+        """read the check mask and suggestion counter, which are
+        updated in place, from the database"""
+        try:
+            self.check_mask, self.suggestion_count = \
+                Unit.objects.filter(id=self.id).values_list('check_mask', 'suggestion_count')[0]
+        except IndexError:
+            return
+        if self._saved_state is not None and self._saved_state > OBSOLETE:
+            # changes in suggestions were propagated as they happened
+            self._saved_stats['suggestions'] = self.suggestion_count
+
+    def checks_counted(self):
+        """are failing checks of this unit part of completestats"""
+        return self._saved_state is not None and self._saved_state > UNTRANSLATED
+
+    def get_check_names(self):
+        return self.qualitycheck_set.filter(false_positive=False).values_list('name', flat=True)
+
+    def save(self, *args, **kwargs):
+        # credited in the file header if the change is synced
+        profile = kwargs.pop('profile', None)
+        self.update_derived_fields()
+        if self.id is not None:
+            # checks and suggestions may have been updated behind this
+            # instance's back, don't overwrite them with stale values
+            self._load_counters()
         super(Unit, self).save(*args, **kwargs)
 
+        new_stats = self.get_unit_stats()
+        self.store.update_stats(stats_delta(self._saved_stats, new_stats), self.mtime)
+        self._saved_stats = new_stats
+
+        if self._saved_state is not None and \
+               self.checks_counted() != (self.state > UNTRANSLATED):
+            # unit moved in or out of the states included in completestats
+            sign = self.checks_counted() and -1 or 1
+            self.store.update_check_stats(dict((name, sign) for name in self.get_check_names()))
+        self._saved_state = self.state
+
+        search_texts = unit_search_texts(self)
+        if self._saved_search_texts is None:
+            UnitTrigram.objects.index_fields(self.id, search_texts)
+            UnitChange.objects.log([self.id], self.store.translation_project_id, UNIT_ADDED)
+        else:
+            # only fields whose text changed are reindexed
+            changed = dict((field, text) for field, text in search_texts.iteritems()
+                           if text != self._saved_search_texts.get(field))
+            if changed:
+                UnitTrigram.objects.index_fields(self.id, changed)
+                UnitChange.objects.log([self.id], self.store.translation_project_id, UNIT_CHANGED)
+        self._saved_search_texts = search_texts
+
+        tm_source = self._get_tm_source()
+        if tm_source != self._saved_tm_source:
+            TMTrigram.objects.index_units([self], self.store.translation_project.language_id)
+            self._saved_tm_source = tm_source
+
         if settings.AUTOSYNC and self.store.file and self.store.state >= PARSED and \
                (self._target_updated or self._source_updated):
-            #FIXME: last translator information is lost
-            self.sync(self.getorig())
-            self.store.update_store_header()
-            self.store.file.savestore()
+            self.autosync(profile=profile)
 
-        if self.store.state >= CHECKED and (self._source_updated or self._target_updated):
+        if self._source_updated or self._target_updated:
             #FIXME: are we sure only source and target affect quality checks?
-            self.update_qualitychecks()
+            if self.store.state >= CHECKED:
+                self.update_qualitychecks()
+            elif self.store.checked_upto is not None and self.id <= self.store.checked_upto:
+                # the check worker already went past this unit, failing
+                # checks are counted once the whole store is checked
+                self.update_qualitychecks(update_stats=False)
 
         # done processing source/target update remove flag
         self._source_updated = False
@@ -224,6 +679,25 @@ class Unit(models.Model, base.TranslationUnit):
             deletefromcache(store,
                             ["getquickstats", "getcompletestats", "get_mtime", "has_suggestions"])
 
+    def delete(self, *args, **kwargs):
+        store = self.store
+        self._load_counters()
+        if self.checks_counted():
+            check_delta = dict((name, -1) for name in self.get_check_names())
+        else:
+            check_delta = {}
+        UnitTrigram.objects.forget_units([self.id])
+        TMTrigram.objects.forget_units([self.id])
+        UnitChange.objects.log([self.id], store.translation_project_id, UNIT_DELETED)
+        super(Unit, self).delete(*args, **kwargs)
+        store.update_stats(stats_delta(self._saved_stats, {}))
+        store.update_check_stats(check_delta)
+        self._saved_stats = {}
+        self._saved_state = None
+        if store.state >= PARSED:
+            deletefromcache(store,
+                            ["getquickstats", "getcompletestats", "get_mtime", "has_suggestions"])
+
     def _get_source(self):
         return self.source_f
 
@@ -293,6 +767,18 @@ class Unit(models.Model, base.TranslationUnit):
         unit = self.store.file.store.findid(self.getid())
         return unit
 
+    def autosync(self, profile=None):
+        """write translation to the store's file, right away or through
+        the write-behind queue when AUTOSYNC_DELAY is set"""
+        if settings.AUTOSYNC_DELAY:
+            sync_queue.mark_dirty(self.store, profile)
+            return
+        #FIXME: last translator information is lost
+        unit = self.getorig()
+        self.sync(unit)
+        self.store.update_store_header(profile=profile)
+        self.store.file.savestore(changed_units=[unit])
+
     def sync(self, unit):
         """sync in file unit with translations from db"""
         changed = False
@@ -391,25 +877,51 @@ class Unit(models.Model, base.TranslationUnit):
                 changed = True
         return changed
 
-    def update_qualitychecks(self, created=False, keep_false_positives=False):
-        """run quality checks and store result in database"""
-        existing = []
+    def update_qualitychecks(self, created=False, keep_false_positives=False, update_stats=True):
+        """run quality checks and store result in database
+
+        unless update_stats is False the change in failing checks is
+        propagated to the stats rollups of the store's ancestors"""
+        existing = set()
+        old_names = []
         if not created:
             checks = self.qualitycheck_set.all()
+            if update_stats and self.checks_counted():
+                old_names = list(checks.filter(false_positive=False).values_list('name', flat=True))
             if keep_false_positives:
                 existing = set(checks.filter(false_positive=True).values_list('name', flat=True))
                 checks = checks.filter(false_positive=False)
             checks.delete()
-        if not self.target:
-            return
-        for name, message in self.store.translation_project.checker.run_filters(self).items():
-            if name == 'isfuzzy' or name in existing:
-                continue
-            self.qualitycheck_set.create(name=name, message=message)
+
+        new_names = []
+        new_checks = []
+        for checked_unit, failures in self.store.translation_project.run_checks([self]):
+            for name, message in failures.iteritems():
+                if name == 'isfuzzy' or name in existing:
+                    continue
+                new_checks.append(QualityCheck(unit=self, name=name, message=message))
+                new_names.append(name)
+        bulk_insert(QualityCheck, new_checks)
+        self.check_mask = QualityCheckName.objects.get_mask(new_names)
+        Unit.objects.filter(id=self.id).update(check_mask=self.check_mask)
+
+        if update_stats and self.checks_counted():
+            delta = {}
+            for name in old_names:
+                delta[name] = delta.get(name, 0) - 1
+            for name in new_names:
+                delta[name] = delta.get(name, 0) + 1
+            self.store.update_check_stats(delta)
 
     def get_qualitychecks(self):
         return self.qualitycheck_set.filter(false_positive=False)
 
+    def update_check_mask(self):
+        """recalculate check_mask after checks were marked as false
+        positives"""
+        self.check_mask = QualityCheckName.objects.get_mask(self.get_check_names())
+        Unit.objects.filter(id=self.id).update(check_mask=self.check_mask)
+
 ##################### TranslationUnit ############################
 
     def getnotes(self, origin=None):
@@ -514,7 +1026,7 @@ class Unit(models.Model, base.TranslationUnit):
         alternative.delete()
 
     def fuzzy_translate(self, matcher):
-        candidates = matcher.matches(self.source)
+        candidates = matcher.matches(self.source, exclude=self.id)
         if candidates:
             match_unit = candidates[0]
             changed = self.merge(match_unit, authoritative=True)
@@ -571,11 +1083,12 @@ class Unit(models.Model, base.TranslationUnit):
         suggestion.target = translation
         try:
             suggestion.save()
-            if touch:
-                self.save()
         except:
             # probably duplicate suggestion
             return None
+        self.update_suggestion_count(1)
+        if touch:
+            self.save()
         return suggestion
 
     def accept_suggestion(self, suggid):
@@ -586,13 +1099,10 @@ class Unit(models.Model, base.TranslationUnit):
 
         self.target = suggestion.target
         self.state = TRANSLATED
-        self.save()
         suggestion.delete()
-        if settings.AUTOSYNC and self.file:
-            #FIXME: update alttrans
-            self.sync(self.getorig())
-            self.store.update_store_header(profile=suggestion.user)
-            self.file.savestore()
+        self.update_suggestion_count(-1)
+        #FIXME: update alttrans
+        self.save(profile=suggestion.user)
         return True
 
     def reject_suggestion(self, suggid):
@@ -601,10 +1111,20 @@ class Unit(models.Model, base.TranslationUnit):
         except Suggestion.DoesNotExist:
             return False
         suggestion.delete()
+        self.update_suggestion_count(-1)
         # update timestamp
         self.save()
         return True
 
+    def update_suggestion_count(self, delta):
+        """apply a change in pending suggestions to the unit's counter
+        and the stats of its store"""
+        Unit.objects.filter(id=self.id).update(suggestion_count=F('suggestion_count') + delta)
+        self.suggestion_count += delta
+        if self._saved_state is not None and self._saved_state > OBSOLETE:
+            self.store.update_stats({'suggestions': delta})
+            self._saved_stats['suggestions'] = self.suggestion_count
+
     def get_terminology(self):
         """get terminology suggestions"""
         matcher = self.store.translation_project.gettermmatcher()
@@ -625,6 +1145,25 @@ fs = FileSystemStorage(location=settings.PODIRECTORY)
 # regexp to parse suggester name from msgidcomment
 suggester_regexp = re.compile(r'suggested by (.*) \[[-0-9]+\]')
 
+def stats_column(key):
+    """name of the Store field holding quickstats key"""
+    return 'stats_' + key
+
+stats_columns = [stats_column(key) for key in quickstats_keys]
+
+def rollup_stats(stores):
+    """quickstats of stores queryset summed up from their stats
+    counters, the same totals their ancestors' rollups are kept at"""
+    for store in stores.filter(stats_total__isnull=True).iterator():
+        # calculates the missing counters
+        store.getquickstats()
+    totals = sum_column(stores.filter(stats_total__isnull=False), stats_columns)
+    stats = {}
+    stats.update(empty_quickstats)
+    for key in quickstats_keys:
+        stats[key] = totals[stats_column(key)] or 0
+    return stats
+
 class StoreManager(RelatedManager):
     def get_by_natural_key(self, pootle_path):
         return self.get(pootle_path=pootle_path)
@@ -649,13 +1188,42 @@ class Store(models.Model, base.TranslationStore):
     name = models.CharField(max_length=128, null=False, editable=False)
     state = models.IntegerField(null=False, default=NEW, editable=False, db_index=True)
 
+    # quickstats counters, kept up to date by Unit.save() and
+    # Unit.delete(), NULL means they were never calculated
+    stats_total = models.IntegerField(null=True, editable=False)
+    stats_totalsourcewords = models.IntegerField(null=True, editable=False)
+    stats_untranslated = models.IntegerField(null=True, editable=False)
+    stats_untranslatedsourcewords = models.IntegerField(null=True, editable=False)
+    stats_fuzzy = models.IntegerField(null=True, editable=False)
+    stats_fuzzysourcewords = models.IntegerField(null=True, editable=False)
+    stats_translated = models.IntegerField(null=True, editable=False)
+    stats_translatedsourcewords = models.IntegerField(null=True, editable=False)
+    stats_translatedtargetwords = models.IntegerField(null=True, editable=False)
+    stats_suggestions = models.IntegerField(null=True, editable=False)
+    # id of the last unit checked while quality checks of the store are
+    # running, so interrupted checks resume where they stopped
+    checked_upto = models.IntegerField(null=True, editable=False)
+
+    def __init__(self, *args, **kwargs):
+        super(Store, self).__init__(*args, **kwargs)
+        self._saved_progress = (self.state, self.checked_upto)
+
     def natural_key(self):
         return (self.pootle_path,)
     natural_key.dependencies = ['pootle_app.Directory']
 
     def save(self, *args, **kwargs):
         self.pootle_path = self.parent.pootle_path + self.name
+        created = self.id is None
+        if not created:
+            # stats counters are updated in place, don't overwrite
+            # them with the possibly stale values of this instance
+            self._load_stats()
+            self._load_check_progress()
         super(Store, self).save(*args, **kwargs)
+        self._saved_progress = (self.state, self.checked_upto)
+        if created:
+            self.parent.link_store(self)
         if hasattr(self, '_units'):
             index = self.max_index() + 1
             for i, unit in enumerate(self._units):
@@ -670,6 +1238,16 @@ class Store(models.Model, base.TranslationStore):
             deletefromcache(self, ["getquickstats", "getcompletestats", "get_mtime", "has_suggestions"])
 
     def delete(self, *args, **kwargs):
+        # take our stats out of the rollups of our ancestors
+        self._load_stats()
+        if self.stats_total is not None:
+            self.propagate_stats(stats_delta(self.get_stored_stats(), {}))
+        if self.state >= CHECKED:
+            self.update_check_stats(stats_delta(self.calculate_completestats(), {}))
+        unit_ids = list(self.unit_set.values_list('id', flat=True))
+        UnitTrigram.objects.forget_units(unit_ids)
+        TMTrigram.objects.forget_units(unit_ids)
+        UnitChange.objects.log(unit_ids, self.translation_project_id, UNIT_DELETED)
         super(Store, self).delete(*args, **kwargs)
         deletefromcache(self, ["getquickstats", "getcompletestats", "get_mtime", "has_suggestions"])
 
@@ -716,11 +1294,9 @@ class Store(models.Model, base.TranslationStore):
                 yield unit
 
     def get_matcher(self):
-        """builds a TM matcher from current translations and obsolete units"""
-        #FIXME: should we cache this?
-        matcher = match.matcher(self, max_candidates=1, usefuzzy=True)
-        matcher.extendtm(self.unit_set.filter(state=OBSOLETE))
-        return matcher
+        """TM matcher over the current translations and obsolete units
+        of the store's language"""
+        return TMMatcher(self.translation_project.language_id, max_candidates=1)
 
     def clean_stale_lock(self):
         if self.state != LOCKED:
@@ -766,12 +1342,19 @@ class Store(models.Model, base.TranslationStore):
             self.state = LOCKED
             self.save()
             try:
-                for index, unit in enumerate(store.units):
-                    if unit.istranslatable():
-                        try:
-                            self.addunit(unit, index)
-                        except IntegrityError, e:
-                            logging.warning(u'Data integrity error while importing unit %s:\n%s', unit.getid(), e)
+                if settings.PARSE_BATCH_SIZE:
+                    self.addunits_bulk(store, settings.PARSE_BATCH_SIZE)
+                    UnitTrigram.objects.index_units(self.unit_set.all())
+                    TMTrigram.objects.index_units(self.unit_set.filter(state__in=(TRANSLATED, OBSOLETE)),
+                                                  self.translation_project.language_id)
+                    UnitChange.objects.log(self.unit_set.values_list('id', flat=True), self.translation_project_id, UNIT_ADDED)
+                else:
+                    for index, unit in enumerate(store.units):
+                        if unit.istranslatable():
+                            try:
+                                self.addunit(unit, index)
+                            except IntegrityError, e:
+                                logging.warning(u'Data integrity error while importing unit %s:\n%s', unit.getid(), e)
             except:
                 # something broke, delete any units that got created
                 # and return store state to its original value
@@ -780,6 +1363,7 @@ class Store(models.Model, base.TranslationStore):
                 self.save()
                 raise
 
+            self.refresh_stats()
             self.state = PARSED
             self.save()
             cache.set(key, self.get_mtime(), settings.OBJECT_CACHE_TIMEOUT)
@@ -859,13 +1443,24 @@ class Store(models.Model, base.TranslationStore):
                         newunit.update_qualitychecks(created=True)
 
             if update_translation:
-                shared_dbids = [self.dbid_index.get(uid) for uid in old_ids & new_ids]
+                shared_ids = old_ids & new_ids
+                if fuzzy or (monolingual and not self.translation_project.is_template_project) or \
+                       hasattr(store.UnitClass, 'getalttrans'):
+                    # units are changed by more than what they have in the file
+                    fingerprints = {}
+                    shared_dbids = [self.dbid_index.get(uid) for uid in shared_ids]
+                else:
+                    fingerprints = self.file_fingerprints(store, shared_ids)
+                    shared_dbids = self.changed_dbids(store, fingerprints, update_structure)
 
                 for unit in self.findid_bulk(shared_dbids):
                     newunit = store.findid(unit.getid())
                     if monolingual and not self.translation_project.is_template_project:
                         fix_monolingual(unit, newunit, monolingual)
                     changed = unit.update(newunit)
+                    if not changed and unit.getid() in fingerprints:
+                        # equal after all, remember so next time we can skip it
+                        Unit.objects.filter(id=unit.id).update(fingerprint=fingerprints[unit.getid()])
                     if update_structure and unit.index != newunit.index:
                         unit.index = newunit.index
                         changed = True
@@ -887,28 +1482,134 @@ class Store(models.Model, base.TranslationStore):
             if update_structure and update_translation and not conservative:
                 cache.set(key, self.get_mtime(), settings.OBJECT_CACHE_TIMEOUT)
 
-    def require_qualitychecks(self):
-        """make sure quality checks are run"""
-        if self.state < CHECKED:
-            self.update_qualitychecks()
-            # new qualitychecks, let's flush cache
-            deletefromcache(self, ["getcompletestats"])
+    def file_fingerprints(self, store, uids):
+        """unit_fingerprint() of the units of toolkit store with ids in
+        uids"""
+        fingerprints = {}
+        for uid in uids:
+            unit = store.findid(uid)
+            if unit is not None:
+                fingerprints[uid] = unit_fingerprint(unit)
+        return fingerprints
+
+    def changed_dbids(self, store, fingerprints, update_index=False):
+        """database ids of units whose fingerprint differs from the one
+        in fingerprints.
+
+        with update_index units that only moved get their new index
+        right away, without being loaded"""
+        changed = []
+        moved = []
+        for dbid, uid, fingerprint, index in self.unit_set.values_list('id', 'unitid', 'fingerprint', 'index').iterator():
+            if uid not in fingerprints:
+                continue
+            if fingerprint != fingerprints[uid]:
+                changed.append(dbid)
+            elif update_index:
+                newindex = store.findid(uid).index
+                if newindex != index:
+                    moved.append((dbid, newindex))
+        for dbid, index in moved:
+            Unit.objects.filter(id=dbid).update(index=index)
+        # search index documents hold the position of units
+        UnitChange.objects.log([dbid for dbid, index in moved], self.translation_project_id, UNIT_CHANGED)
+        logging.debug(u"%d changed and %d moved units in %s", len(changed), len(moved), self.pootle_path)
+        return changed
+
+    def require_qualitychecks(self, background=None):
+        """make sure quality checks are run, returns False if they are
+        still pending.
+
+        with BACKGROUND_QUALITYCHECKS unchecked stores are queued for the
+        check worker instead of being checked right away"""
+        if self.state >= CHECKED:
+            return True
+        if background is None:
+            background = settings.BACKGROUND_QUALITYCHECKS
+        if background:
+            from pootle_store.checkqueue import check_queue
+            check_queue.schedule(self)
+            return False
+        self.update_qualitychecks()
+        # new qualitychecks, let's flush cache
+        deletefromcache(self, ["getcompletestats"])
+        return True
+
+    def has_pending_checks(self):
+        return PARSED <= self.state < CHECKED
 
-    @commit_on_success
     def update_qualitychecks(self):
+        """run quality checks on all units, CHECK_BATCH_SIZE units at a
+        time. progress of a store that wasn't checked before is saved
+        after every batch"""
         logging.debug(u"Updating quality checks for %s", self.pootle_path)
-        for unit in self.units.iterator():
-            unit.update_qualitychecks()
+        # rollups only include checks of stores that were checked before
+        checked = self.state >= CHECKED
+        unit_ids = self.units.values_list('id', flat=True).order_by('id')
+        if checked:
+            old_stats = self.calculate_completestats()
+        elif self.checked_upto is not None:
+            logging.debug(u"Resuming quality checks for %s after unit %d", self.pootle_path, self.checked_upto)
+            unit_ids = unit_ids.filter(id__gt=self.checked_upto)
+
+        false_positives = set(QualityCheck.objects.filter(unit__store=self, false_positive=True).values_list('unit', 'name'))
+        batch_size = max(settings.CHECK_BATCH_SIZE, 1)
+        unit_ids = list(unit_ids)
+        for start in xrange(0, len(unit_ids), batch_size):
+            self._check_batch(unit_ids[start:start+batch_size], false_positives, save_progress=not checked)
+
+        if checked:
+            self.update_check_stats(stats_delta(old_stats, self.calculate_completestats()))
+        else:
+            self._finish_checks()
 
-        if self.state < CHECKED:
-            self.state = CHECKED
-            self.save()
+    @commit_on_success
+    def _check_batch(self, unit_ids, false_positives, save_progress):
+        QualityCheck.objects.filter(unit__in=unit_ids, false_positive=False).delete()
+        new_checks = []
+        masks = {}
+        units = Unit.objects.filter(id__in=unit_ids)
+        for unit, failures in self.translation_project.run_checks(units):
+            names = []
+            for name, message in failures.iteritems():
+                if name == 'isfuzzy' or (unit.id, name) in false_positives:
+                    continue
+                new_checks.append(QualityCheck(unit=unit, name=name, message=message))
+                names.append(name)
+            if names:
+                masks.setdefault(QualityCheckName.objects.get_mask(names), []).append(unit.id)
+        bulk_insert(QualityCheck, new_checks, batch_size=len(new_checks))
+        # few units fail the same set of checks, one update per set
+        Unit.objects.filter(id__in=unit_ids).exclude(check_mask=0).update(check_mask=0)
+        for mask, ids in masks.iteritems():
+            Unit.objects.filter(id__in=ids).update(check_mask=mask)
+        if save_progress:
+            self.checked_upto = unit_ids[-1]
+            Store.objects.filter(id=self.id).update(checked_upto=self.checked_upto)
+            self._saved_progress = (self._saved_progress[0], self.checked_upto)
+
+    @commit_on_success
+    def _finish_checks(self):
+        # only whoever moves the store to CHECKED adds its checks to
+        # the rollups, locked stores are finished by the next run
+        if not Store.objects.filter(id=self.id, state__gte=PARSED, state__lt=CHECKED) \
+               .update(state=CHECKED, checked_upto=None):
+            return
+        self.update_check_stats(self.calculate_completestats())
+        self.state = CHECKED
+        self.checked_upto = None
+        self._saved_progress = (self.state, self.checked_upto)
+        self.save()
+
+    def has_unsynced_changes(self):
+        """has the database changed since the file was last synced"""
+        last_sync = cache.get(iri_to_uri("%s:sync" % self.pootle_path))
+        return not last_sync or last_sync != self.get_mtime()
 
     def sync(self, update_structure=False, update_translation=False, conservative=True, create=False, profile=None):
         """sync file with translations from db"""
         key = iri_to_uri("%s:sync" % self.pootle_path)
-        last_sync = cache.get(key)
-        if conservative and last_sync and last_sync == self.get_mtime():
+        if conservative and not self.has_unsynced_changes():
             return
 
         if not self.file:
@@ -936,6 +1637,8 @@ class Store(models.Model, base.TranslationStore):
         new_ids = set(self.dbid_index.keys())
 
         file_changed = False
+        structure_changed = False
+        changed_units = []
 
         if update_structure:
             obsolete_units = (self.file.store.findid(uid) for uid in old_ids - new_ids)
@@ -947,17 +1650,25 @@ class Store(models.Model, base.TranslationStore):
                     if not unit.isobsolete():
                         del unit
                 file_changed = True
+                structure_changed = True
 
             new_dbids = [self.dbid_index.get(uid) for uid in new_ids - old_ids]
             for unit in self.findid_bulk(new_dbids):
                 newunit = unit.convert(self.file.store.UnitClass)
                 self.file.store.addunit(newunit)
                 file_changed = True
+                structure_changed = True
 
         monolingual = is_monolingual(type(self.file.store))
 
         if update_translation:
-            shared_dbids = [self.dbid_index.get(uid) for uid in old_ids & new_ids]
+            shared_ids = old_ids & new_ids
+            if hasattr(self.file.store.UnitClass, 'addalttrans'):
+                # suggestions are synced too
+                shared_dbids = [self.dbid_index.get(uid) for uid in shared_ids]
+            else:
+                fingerprints = self.file_fingerprints(self.file.store, shared_ids)
+                shared_dbids = self.changed_dbids(self.file.store, fingerprints)
             for unit in self.findid_bulk(shared_dbids):
                 #FIXME: use a better mechanism for handling states and different formats
                 if monolingual and not unit.istranslated():
@@ -967,10 +1678,14 @@ class Store(models.Model, base.TranslationStore):
                     changed = unit.sync(match)
                     if changed:
                         file_changed = True
+                        changed_units.append(match)
 
         if file_changed:
             self.update_store_header(profile=profile)
-            self.file.savestore()
+            if structure_changed:
+                self.file.savestore()
+            else:
+                self.file.savestore(changed_units=changed_units)
 
         cache.set(key, self.get_mtime(), settings.OBJECT_CACHE_TIMEOUT)
 
@@ -1044,6 +1759,40 @@ class Store(models.Model, base.TranslationStore):
             self._units.append(newunit)
         return newunit
 
+    def addunits_bulk(self, store, batch_size):
+        """add all translatable units of store to the database using
+        multi-row INSERTs, only safe for stores without units in db"""
+        newunits = []
+        unitid_hashes = set()
+        for index, unit in enumerate(store.units):
+            if not unit.istranslatable():
+                continue
+            newunit = Unit(store=self, index=index)
+            newunit.update(unit)
+            newunit.update_derived_fields()
+            if newunit.unitid_hash in unitid_hashes:
+                # the unique constraint would reject the whole batch
+                logging.warning(u'Data integrity error while importing unit %s:\n%s', unit.getid(),
+                                u'duplicate unit id')
+                continue
+            unitid_hashes.add(newunit.unitid_hash)
+            newunits.append(newunit)
+
+        for i in xrange(0, len(newunits), batch_size):
+            batch = newunits[i:i+batch_size]
+            sid = savepoint()
+            try:
+                bulk_insert(Unit, batch, batch_size)
+                savepoint_commit(sid)
+            except IntegrityError:
+                savepoint_rollback(sid)
+                # find the offending units the slow way
+                for newunit in batch:
+                    try:
+                        newunit.save()
+                    except IntegrityError, e:
+                        logging.warning(u'Data integrity error while importing unit %s:\n%s', newunit.getid(), e)
+
     def findunits(self, source, obsolete=False):
         if not obsolete and hasattr(self, "sourceindex"):
             return super(Store, self).findunits(source)
@@ -1090,11 +1839,98 @@ class Store(models.Model, base.TranslationStore):
 
 ############################### Stats ############################
 
+    def _load_stats(self):
+        """read stats counters from the database"""
+        try:
+            values = Store.objects.filter(id=self.id).values(*stats_columns)[0]
+        except IndexError:
+            return
+        for column, value in values.iteritems():
+            setattr(self, column, value)
+
+    def _load_check_progress(self):
+        """read state and checked_upto from the database unless this
+        instance changed them, the check worker moves them on in
+        place"""
+        try:
+            state, checked_upto = Store.objects.filter(id=self.id).values_list('state', 'checked_upto')[0]
+        except IndexError:
+            return
+        saved_state, saved_checked_upto = self._saved_progress
+        if self.state == saved_state or \
+               (state == CHECKED and self.state == PARSED and saved_state != CHECKED):
+            # a store finished checking behind our back is not sent
+            # back to be checked again
+            self.state = state
+        if self.checked_upto == saved_checked_upto:
+            self.checked_upto = checked_upto
+
+    def get_stored_stats(self):
+        """quickstats as currently held by the stats counters"""
+        return dict((key, getattr(self, stats_column(key))) for key in quickstats_keys)
+
+    def get_rollup_paths(self):
+        """pootle_paths of the directories, translation project,
+        language and project whose stats include this store"""
+        path_parts = self.pootle_path.split('/')
+        if path_parts[1] == 'templates':
+            # template stats are never aggregated
+            return []
+        # translation project directory and subdirectories
+        paths = ['/'.join(path_parts[:i]) + '/' for i in xrange(3, len(path_parts))]
+        if not self.translation_project.is_template_project:
+            paths.append('/%s/' % path_parts[1])
+            paths.append('/projects/%s/' % path_parts[2])
+        return paths
+
+    def propagate_stats(self, delta, mtime=None):
+        """apply a change in stats to the rollups of all ancestors"""
+        PathStats.objects.update_stats(self.get_rollup_paths(), delta, mtime)
+
+    def update_stats(self, delta, mtime=None):
+        """apply a change in unit stats to the stats counters and
+        the rollups of all ancestors"""
+        if self.id is None:
+            return
+        if delta:
+            updates = dict((stats_column(key), F(stats_column(key)) + value) for key, value in delta.iteritems())
+            # counters that were never calculated will be rebuilt when
+            # needed, and ancestors don't include them either
+            if not Store.objects.filter(id=self.id, stats_total__isnull=False).update(**updates):
+                delta = None
+        if delta or mtime is not None:
+            self.propagate_stats(delta, mtime)
+
+    def update_check_stats(self, delta):
+        """apply a change in failing quality checks to the rollups of
+        all ancestors"""
+        if delta:
+            PathStats.objects.update_checks(self.get_rollup_paths(), delta)
+
+    def refresh_stats(self):
+        """recalculate stats counters from scratch"""
+        self._load_stats()
+        if self.stats_total is None:
+            old_stats = {}
+        else:
+            old_stats = self.get_stored_stats()
+        stats = calculate_stats(self.unit_set.filter(state__gt=OBSOLETE))
+        values = dict((stats_column(key), stats[key]) for key in quickstats_keys)
+        Store.objects.filter(id=self.id).update(**values)
+        for column, value in values.iteritems():
+            setattr(self, column, value)
+        self.propagate_stats(stats_delta(old_stats, stats), max_column(self.unit_set.all(), 'mtime', None))
+        return stats
+
     @getfromcache
     def getquickstats(self):
-        """calculate translation statistics"""
+        """read translation statistics from stats counters"""
         try:
-            return calculate_stats(self.units)
+            self.require_units()
+            self._load_stats()
+            if self.stats_total is None:
+                return self.refresh_stats()
+            return self.get_stored_stats()
         except IntegrityError:
             logging.info(u"Duplicate IDs in %s", self.abs_real_path)
         except base.ParseError, e:
@@ -1106,17 +1942,21 @@ class Store(models.Model, base.TranslationStore):
         stats['errors'] += 1
         return stats
 
+    def calculate_completestats(self):
+        return calculate_check_stats(self.unit_set.all())
+
     @getfromcache
     def getcompletestats(self):
-        """report result of quality checks"""
-        self.require_qualitychecks()
-        queryset = QualityCheck.objects.filter(unit__store=self, unit__state__gt=UNTRANSLATED, false_positive=False)
-        return group_by_count(queryset, 'name')
+        """report result of quality checks, empty while checks are
+        pending"""
+        if not self.require_qualitychecks():
+            return {}
+        return self.calculate_completestats()
 
     @getfromcache
     def has_suggestions(self):
         """check if any unit in store has suggestions"""
-        return Suggestion.objects.filter(unit__store=self, unit__state__gt=OBSOLETE).count()
+        return self.getquickstats().get('suggestions', 0)
 
 ################################ Translation #############################
 
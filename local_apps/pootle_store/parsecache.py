@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Zuza Software Foundation
+#
+# This file is part of Pootle.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""on disk cache of parsed translation stores shared by all server
+processes, enabled by setting PARSE_CACHE_DIRECTORY"""
+
+import os
+import logging
+import tempfile
+import cPickle
+
+from django.conf import settings
+
+from translate.misc.hash import md5_f
+
+def _cache_path(path):
+    return os.path.join(settings.PARSE_CACHE_DIRECTORY, md5_f(path.encode('utf-8')).hexdigest() + ".pickle")
+
+def load(path, mod_info):
+    """return the parsed store for path if it was cached for the same
+    (mtime, size) of the file, None otherwise"""
+    if not settings.PARSE_CACHE_DIRECTORY:
+        return None
+    cache_path = _cache_path(path)
+    try:
+        cache_file = open(cache_path, 'rb')
+    except IOError:
+        return None
+    try:
+        try:
+            if cPickle.load(cache_file) != mod_info:
+                return None
+            store = cPickle.load(cache_file)
+        except Exception, e:
+            logging.debug(u"Failed to load cached %s: %s", path, e)
+            return None
+    finally:
+        cache_file.close()
+    # mark as recently used
+    try:
+        os.utime(cache_path, None)
+    except OSError:
+        pass
+    return store
+
+def save(path, mod_info, store):
+    """cache parsed store for path"""
+    if not settings.PARSE_CACHE_DIRECTORY:
+        return
+    tmpfilename = None
+    try:
+        if not os.path.isdir(settings.PARSE_CACHE_DIRECTORY):
+            os.makedirs(settings.PARSE_CACHE_DIRECTORY)
+        tmpfile, tmpfilename = tempfile.mkstemp(dir=settings.PARSE_CACHE_DIRECTORY)
+        cache_file = os.fdopen(tmpfile, 'wb')
+        try:
+            cPickle.dump(mod_info, cache_file, cPickle.HIGHEST_PROTOCOL)
+            cPickle.dump(store, cache_file, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            cache_file.close()
+        os.rename(tmpfilename, _cache_path(path))
+    except Exception, e:
+        # some stores, like the ones based on gettext's C library,
+        # can't be pickled
+        logging.debug(u"Failed to cache %s: %s", path, e)
+        if tmpfilename is not None and os.path.exists(tmpfilename):
+            os.remove(tmpfilename)
+        return
+    cull()
+
+def delete(path):
+    if not settings.PARSE_CACHE_DIRECTORY:
+        return
+    try:
+        os.remove(_cache_path(path))
+    except OSError:
+        pass
+
+def cull():
+    """remove least recently used stores until the cache is at most
+    3/4 of PARSE_CACHE_SIZE"""
+    entries = []
+    total = 0
+    for filename in os.listdir(settings.PARSE_CACHE_DIRECTORY):
+        try:
+            stat = os.stat(os.path.join(settings.PARSE_CACHE_DIRECTORY, filename))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, filename))
+        total += stat.st_size
+    if total <= settings.PARSE_CACHE_SIZE:
+        return
+
+    entries.sort()
+    limit = settings.PARSE_CACHE_SIZE * 3 / 4
+    for mtime, size, filename in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(os.path.join(settings.PARSE_CACHE_DIRECTORY, filename))
+            total -= size
+        except OSError:
+            pass
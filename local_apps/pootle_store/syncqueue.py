@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Zuza Software Foundation
+#
+# This file is part of Pootle.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""write-behind saving of translation files for AUTOSYNC"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+def sync_store(store, profile=None):
+    """write translations changed in the database to the store's file,
+    crediting profile in its header"""
+    if store.file:
+        store.sync(update_translation=True, conservative=False, profile=profile)
+
+
+class SyncQueue(object):
+    """stores with translations not yet written to disk.
+
+    a store is written at most once every delay seconds, no matter how
+    many units were saved in the meantime, by a background thread that
+    is started when the first store gets queued."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._pending = {}
+        """store id -> time it was first queued"""
+        self._profiles = {}
+        """store id -> profile of its last change, if it was given"""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def mark_dirty(self, store, profile=None):
+        self._lock.acquire()
+        try:
+            self._pending.setdefault(store.id, time.time())
+            if profile is not None:
+                self._profiles[store.id] = profile
+            else:
+                # the header falls back to the latest submission
+                self._profiles.pop(store.id, None)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pootle-autosync")
+                self._thread.setDaemon(True)
+                self._thread.start()
+        finally:
+            self._lock.release()
+
+    def _run(self):
+        while True:
+            time.sleep(min(self.delay, 1))
+            try:
+                self.flush(self.delay)
+            except Exception, e:
+                logging.error(u"Failed to save translation files:\n%s", e)
+            # don't hold on to a database connection while sleeping
+            connection.close()
+
+    def flush(self, max_age=0):
+        """write all stores that were queued at least max_age seconds
+        ago"""
+        from pootle_store.models import Store
+
+        self._flush_lock.acquire()
+        try:
+            self._lock.acquire()
+            try:
+                now = time.time()
+                store_ids = [store_id for store_id, queued in self._pending.iteritems() if now - queued >= max_age]
+                profiles = {}
+                for store_id in store_ids:
+                    del self._pending[store_id]
+                    profiles[store_id] = self._profiles.pop(store_id, None)
+            finally:
+                self._lock.release()
+
+            for store in Store.objects.filter(id__in=store_ids).iterator():
+                logging.debug(u"Saving queued changes to %s", store.pootle_path)
+                sync_store(store, profiles[store.id])
+        finally:
+            self._flush_lock.release()
+
+    def __len__(self):
+        return len(self._pending)
+
+sync_queue = SyncQueue(settings.AUTOSYNC_DELAY)
+
+# don't lose queued changes when the server shuts down
+atexit.register(sync_queue.flush)
@@ -47,6 +47,28 @@ def find_altsrcs(unit, alt_src_langs, store=None, project=None):
         altsrcs = altsrcs.filter(store__name=store.name)
     return altsrcs
 
+def find_altsrcs_batch(units, alt_src_langs, project):
+    """L{find_altsrcs} for several units of C{project} with a single
+    query, returns a dictionary of alternative sources by unit id"""
+    nongnu = project.get_treestyle() == 'nongnu'
+    altsrcs = {}
+    for unit in units:
+        altsrcs[unit.id] = []
+    if not units:
+        return altsrcs
+    found = Unit.objects.filter(unitid_hash__in=set(unit.unitid_hash for unit in units),
+                                store__translation_project__project=project,
+                                store__translation_project__language__in=alt_src_langs,
+                                state=TRANSLATED).select_related('store', 'store__translation_project', 'store__translation_project__language')
+    by_hash = {}
+    for altunit in found.iterator():
+        by_hash.setdefault(altunit.unitid_hash, []).append(altunit)
+    for unit in units:
+        for altunit in by_hash.get(unit.unitid_hash, []):
+            if not nongnu or altunit.store.name == unit.store.name:
+                altsrcs[unit.id].append(altunit)
+    return altsrcs
+
 def call_highlight(old, new):
     """Calls diff highlighting code only if the target is set.
     Otherwise, highlight as a normal unit.
@@ -18,14 +18,23 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 import time
+import urllib
 
 from django.utils import simplejson
 
 from translate.storage import factory
 from translate.storage import statsdb
+from translate.misc.multistring import multistring
 
 from pootle.tests import PootleTestCase
-from pootle_store.models import Store, Unit
+from pootle_store.models import Store, Unit, QualityCheck, QualityCheckName, NEW, PARSED, CHECKED, stats_column
+from pootle_store.models import filter_failing_checks, filter_trigrams, TMMatcher, UnitTrigram
+from pootle_store.views import UNIT_ORDER, _get_units_page, _get_index_in_qs, _build_units_list, _unit_fragment_key
+from pootle_store.templatetags.store_tags import fancy_highlight
+from pootle_store.util import calculate_stats, quickstats_keys, statssum, OBSOLETE, UNTRANSLATED, TRANSLATED, SEARCH_FIELDS
+from pootle_statistics.models import PathStats
+from pootle_app.models import Directory
+from pootle_misc.aggregate import group_by_count
 
 class UnitTests(PootleTestCase):
     def setUp(self):
@@ -151,6 +160,235 @@ class StoreTests(PootleTestCase):
         self.assertEqual(dbstats['translatedsourcewords'], filestats['translatedsourcewords'])
         self.assertEqual(dbstats['translatedtargetwords'], filestats['translatedtargetwords'])
 
+    def _stored_stats(self):
+        store = Store.objects.get(id=self.store.id)
+        return dict((key, getattr(store, stats_column(key))) for key in quickstats_keys)
+
+    def test_stats_counters(self):
+        """stats counters follow unit changes"""
+        unit = self.store.getitem(0)
+        unit.target = u'samaka'
+        unit.save()
+        self.assertEqual(self._stored_stats(), calculate_stats(self.store.units))
+
+        unit.markfuzzy()
+        unit.save()
+        self.assertEqual(self._stored_stats(), calculate_stats(self.store.units))
+
+        self.store.getitem(1).delete()
+        self.assertEqual(self._stored_stats(), calculate_stats(self.store.units))
+
+    def test_stats_rollup(self):
+        """directory and language rollups follow unit changes"""
+        translation_project = self.store.translation_project
+        rollup = PathStats.objects.get_rollup(translation_project.pootle_path,
+                                              translation_project.directory._calculate_quickstats, lambda: None)
+        language_rollup = translation_project.language.get_rollup()
+        unit = self.store.getitem(0)
+        unit.target = u'samaka'
+        unit.save()
+
+        expected = calculate_stats(Unit.objects.filter(store__translation_project=translation_project, state__gt=OBSOLETE))
+        rollup = PathStats.objects.get(id=rollup.id)
+        self.assertEqual(rollup.get_quickstats(), expected)
+        self.assertEqual(rollup.mtime, unit.mtime)
+        language_rollup = PathStats.objects.get(id=language_rollup.id)
+        self.assertEqual(language_rollup.get_quickstats(), statssum(translation_project.language.translationproject_set.iterator()))
+
+    def test_cache_invalidation(self):
+        """cached stats of the store and its ancestors are invalidated
+        by unit changes"""
+        translation_project = self.store.translation_project
+        translated = self.store.getquickstats()['translated']
+        tp_translated = translation_project.getquickstats()['translated']
+        unit = self.store.units.filter(state=UNTRANSLATED)[0]
+        unit.target = u'samaka'
+        unit.save()
+        self.assertEqual(self.store.getquickstats()['translated'], translated + 1)
+        self.assertEqual(translation_project.getquickstats()['translated'], tp_translated + 1)
+
+    def test_savestore_patch(self):
+        """patching changed units into a PO file gives the same units as
+        saving the whole file"""
+        filestore = self.store.file.store
+        unit = filestore.units[1]
+        unit.target = u'samaka'
+        self.store.file.savestore(changed_units=[unit])
+        self.assertNotEqual(self.store.file._store_tuple.layout, None)
+
+        reparsed = factory.getobject(self.store.file.path)
+        self.assertEqual([unit.getid() for unit in reparsed.units], [unit.getid() for unit in filestore.units])
+        self.assertEqual([unit.target for unit in reparsed.units], [unit.target for unit in filestore.units])
+
+    def test_changed_dbids(self):
+        """only units changed in the file are picked up for update"""
+        filestore = self.store.file.store
+        fileunit = [unit for unit in filestore.units if unit.istranslatable()][0]
+        fileunit.target = u'samaka'
+        fingerprints = self.store.file_fingerprints(filestore, filestore.getids())
+        changed = self.store.changed_dbids(filestore, fingerprints)
+        self.assertEqual(changed, [self.store.findid(fileunit.getid()).id])
+
+    def test_update_qualitychecks(self):
+        """rerunning checks keeps false positives and reuses the checker"""
+        unit = self.store.units.filter(state__gt=UNTRANSLATED)[0]
+        unit.target = u'%s!!' % unit.target
+        unit.save()
+        checker = self.store.translation_project.checker
+        self.store.update_qualitychecks()
+        check = QualityCheck.objects.filter(unit=unit)[0]
+        check.false_positive = True
+        check.save()
+
+        self.store.update_qualitychecks()
+        self.assertTrue(QualityCheck.objects.filter(id=check.id, false_positive=True).exists())
+        self.assertFalse(QualityCheck.objects.filter(unit=unit, name=check.name, false_positive=False).exists())
+        self.assertTrue(self.store.translation_project.checker is checker)
+
+    def test_resume_qualitychecks(self):
+        """interrupted quality checks continue after the last checked unit"""
+        unit_ids = list(self.store.units.filter(state__gt=UNTRANSLATED).values_list('id', flat=True).order_by('id'))
+        self.store.update_qualitychecks()
+        QualityCheck.objects.filter(unit__store=self.store).delete()
+        self.store.state = PARSED
+        self.store.checked_upto = unit_ids[0]
+        self.store.save()
+
+        self.assertTrue(self.store.has_pending_checks())
+        self.store.update_qualitychecks()
+        self.assertFalse(QualityCheck.objects.filter(unit=unit_ids[0]).exists())
+        store = Store.objects.get(id=self.store.id)
+        self.assertEqual(store.state, CHECKED)
+        self.assertEqual(store.checked_upto, None)
+        self.assertFalse(store.has_pending_checks())
+
+    def test_finish_checks_once(self):
+        """stale instances don't send a checked store back to be checked"""
+        self.store.state = PARSED
+        self.store.save()
+        stale = Store.objects.get(id=self.store.id)
+        self.store.update_qualitychecks()
+        directory = self.store.parent
+        stats = directory.get_rollup().get_completestats(directory._calculate_completestats)
+
+        stale.save()
+        self.assertEqual(Store.objects.get(id=self.store.id).state, CHECKED)
+        stale._finish_checks()
+        self.assertEqual(directory.get_rollup().get_completestats(directory._calculate_completestats), stats)
+
+    def test_check_mask(self):
+        """check masks agree with the failing checks of units"""
+        unit = self.store.units.filter(state__gt=UNTRANSLATED)[0]
+        unit.target = u'%s!!' % unit.target
+        unit.save()
+        self.store.update_qualitychecks()
+        for unit in self.store.units.iterator():
+            self.assertEqual(unit.check_mask, QualityCheckName.objects.get_mask(unit.get_check_names()))
+
+        checks = QualityCheck.objects.filter(unit__store=self.store, unit__state__gt=UNTRANSLATED, false_positive=False)
+        self.assertEqual(self.store.calculate_completestats(), group_by_count(checks, 'name'))
+        names = list(checks.values_list('name', flat=True).distinct())
+        self.assertEqual(set(filter_failing_checks(self.store.units, names).values_list('id', flat=True)),
+                         set(checks.values_list('unit', flat=True)))
+        # every registered name got a bit, including the first one
+        bits, unmapped = QualityCheckName.objects.get_bits()
+        self.assertEqual(sorted(bits.values()), range(len(bits)))
+
+    def test_suggestion_counts(self):
+        """suggestion counters follow added and rejected suggestions"""
+        self.store.getquickstats()
+        translation_project = self.store.translation_project
+        rollup = PathStats.objects.get_rollup(translation_project.pootle_path,
+                                              translation_project.directory._calculate_quickstats, lambda: None)
+        unit = self.store.units.filter(state=UNTRANSLATED)[0]
+        suggestion = unit.add_suggestion(u'samaka')
+        self.assertEqual(Unit.objects.get(id=unit.id).suggestion_count, 1)
+        self.assertEqual(self._stored_stats()['suggestions'], 1)
+        self.assertEqual(PathStats.objects.get(id=rollup.id).suggestions, 1)
+        self.assertEqual(list(self.store.units.filter(suggestion_count__gt=0)), [unit])
+
+        unit.reject_suggestion(suggestion.id)
+        self.assertEqual(Unit.objects.get(id=unit.id).suggestion_count, 0)
+        self.assertEqual(self._stored_stats()['suggestions'], 0)
+        self.assertEqual(PathStats.objects.get(id=rollup.id).suggestions, 0)
+
+    def test_directory_tree(self):
+        """stores and directories are linked to all their ancestors"""
+        directory = self.store.translation_project.directory
+        subdir = directory.get_or_make_subdir('subdir')
+        store = Store(parent=subdir, name='new.po', translation_project=self.store.translation_project)
+        store.save()
+        for ancestor in (Directory.objects.root, directory, subdir):
+            self.assertEqual(set(ancestor.descendant_stores()),
+                             set(Store.objects.filter(pootle_path__startswith=ancestor.pootle_path)))
+        self.assertEqual(list(Directory.objects.filter(ancestor_links__ancestor=directory).order_by('pootle_path')),
+                         [directory, subdir])
+
+    def test_units_page(self):
+        """cursor paging returns the same units as offsets"""
+        units = Unit.objects.filter(store__translation_project=self.store.translation_project).order_by(*UNIT_ORDER)
+        unit_list = list(units)
+        page, more = _get_units_page(units, unit_list[0], 2)
+        self.assertEqual(page, unit_list[1:3])
+        self.assertEqual(more, len(unit_list) > 3)
+        page, more = _get_units_page(units, unit_list[-1], 2, reverse=True)
+        self.assertEqual(page, unit_list[-3:-1])
+        self.assertEqual(_get_index_in_qs(units, unit_list[-1]), len(unit_list) - 1)
+
+    def test_unit_fragments(self):
+        """cached renderings of units are replaced when the unit changes"""
+        unit = self.store.units[0]
+        units = _build_units_list([unit])
+        self.assertEqual(_build_units_list([unit]), units)
+        unit.target = u"changed translation"
+        unit.save()
+        units = _build_units_list([unit])
+        self.assertEqual(units[0]['target'][0]['text'], fancy_highlight(u"changed translation"))
+        # plural forms past the first one are part of the key too
+        unit.target_f = multistring([u"one", u"two"])
+        key = _unit_fragment_key(unit, 'en')
+        unit.target_f = multistring([u"one", u"three"])
+        self.assertNotEqual(_unit_fragment_key(unit, 'en'), key)
+
+    def test_search_index(self):
+        """searches narrowed down by trigrams find the same units"""
+        unit = self.store.units[0]
+        source_trigrams = UnitTrigram.objects.filter(unit_id=unit.id, field=SEARCH_FIELDS['source'])
+        source_ids = list(source_trigrams.values_list('id', flat=True))
+        unit.target = u"Fishing for fish"
+        unit.save()
+        # unchanged fields are not reindexed
+        self.assertEqual(list(source_trigrams.values_list('id', flat=True)), source_ids)
+        units = self.store.units
+        for word in (u"fish", u"FISH", u"hing", u"no such word"):
+            self.assertEqual(list(filter_trigrams(units, 'target', word).filter(target_f__icontains=word)),
+                             list(units.filter(target_f__icontains=word)))
+        self.assertTrue(unit in filter_trigrams(units, 'target', u"fish"))
+
+    def test_tm_matcher(self):
+        """translations of similar sources are found in the TM index"""
+        unit = self.store.units.filter(state=TRANSLATED)[0]
+        matcher = TMMatcher(self.store.translation_project.language_id, max_candidates=10)
+        self.assertTrue(unit in matcher.matches(unit.source))
+        self.assertFalse(unit in matcher.matches(unit.source, exclude=unit.id))
+        unit.target = u""
+        unit.save()
+        self.assertFalse(unit in matcher.matches(unit.source))
+
+    def test_parse_bulk(self):
+        """units imported in batches match the units in the file"""
+        self.store.unit_set.all().delete()
+        self.store.state = NEW
+        self.store.save()
+        self.store.parse()
+
+        fileunits = [unit for unit in self.store.file.store.units if unit.istranslatable()]
+        dbunits = list(self.store.units.iterator())
+        self.assertEqual(len(dbunits), len(fileunits))
+        for dbunit, fileunit in zip(dbunits, fileunits):
+            self.assertEqual(dbunit.getid(), fileunit.getid())
+            self.assertEqual(dbunit.target, fileunit.target)
+
 
 class XHRTestAnonymous(PootleTestCase):
     """
@@ -239,6 +477,45 @@ class XHRTestAnonymous(PootleTestCase):
         self.assertEqual(r.status_code, 200)
         self.assertTemplateUsed(r, 'unit/edit.html')
 
+    def test_get_edit_units_good_response(self):
+        """Checks the editors of the following units are returned too."""
+        r = self.client.get("/unit/edit/%s/next/2" % self.uid,
+                            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(r.status_code, 200)
+        units = simplejson.loads(r.content)['units']
+        self.assertEqual([unit['id'] for unit in units],
+                         [unit.id for unit in self.store.units[:3]])
+
+    #
+    # Tests for the search_units() view.
+    #
+    def test_search_units_good_response(self):
+        """Checks matching units are returned a page at a time."""
+        word = self.unit.source.split()[0]
+        r = self.client.get("%(pootle_path)s/search" % {'pootle_path': self.path},
+                            {'search': word, 'sfields': 'source'},
+                            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(r.status_code, 200)
+        json = simplejson.loads(r.content)
+        self.assertTrue(self.uid in [unit['id'] for unit in json['units']])
+        self.assertEqual(json['more'], json['cursor'] is not None)
+
+    #
+    # Tests for the get_tm_units() view.
+    #
+    def test_get_tm_units_good_response(self):
+        """Checks translations are suggested in amaGama's format."""
+        unit = self.store.units.filter(state=TRANSLATED)[0]
+        tp = self.store.translation_project
+        r = self.client.get("/tmserver/%s/%s/unit/%s" % (tp.project.source_language.code, tp.language.code,
+                                                         urllib.quote(unit.source.encode('utf-8'))),
+                            {'max_candidates': 20, 'jsoncallback': 'callback'})
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.content.startswith('callback('))
+        suggestions = simplejson.loads(r.content[len('callback('):-1])
+        self.assertTrue({'source': unicode(unit.source), 'target': unicode(unit.target),
+                         'quality': 100, 'rank': 100} in suggestions)
+
     #
     # Tests for the get_failing_checks() view.
     #
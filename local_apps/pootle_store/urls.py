@@ -22,6 +22,7 @@
 from django.conf.urls.defaults import *
 
 urlpatterns = patterns('pootle_store.views',
+    (r'^tmserver/(?P<source_language>[^/]+)/(?P<target_language>[^/]+)/unit/(?P<text>.+)$', 'get_tm_units'),
     (r'^(?P<pootle_path>.*)/export/xlf/?$', 'export_as_xliff'),
     (r'^(?P<pootle_path>.*)/export_store/(?P<filetype>.*)/?$', 'export_as_type'),
     (r'^(?P<pootle_path>.*)/download/?$', 'download'),
@@ -29,8 +30,10 @@ urlpatterns = patterns('pootle_store.views',
     (r'^(?P<pootle_path>.*)/checks/?$', 'get_failing_checks_store'),
     (r'^(?P<pootle_path>.*)/view/?$', 'get_view_units_store'),
     (r'^(?P<pootle_path>.*)/view/limit/(?P<limit>[0-9]+)/?$', 'get_view_units_store'),
+    (r'^(?P<pootle_path>.*)/search/?$', 'search_units_store'),
     (r'^unit/context/(?P<uid>[0-9]+)/?$', 'get_more_context'),
     (r'^unit/edit/(?P<uid>[0-9]+)/?$', 'get_edit_unit'),
+    (r'^unit/edit/(?P<uid>[0-9]+)/next/(?P<count>[0-9]+)/?$', 'get_edit_units'),
     (r'^unit/process/(?P<uid>[0-9]+)/(?P<type>submission|suggestion)/?$', 'process_submit'),
     (r'^suggestion/reject/(?P<uid>[0-9]+)/(?P<suggid>[0-9]+)/?$', 'reject_suggestion'),
     (r'^suggestion/accept/(?P<uid>[0-9]+)/(?P<suggid>[0-9]+)/?$', 'accept_suggestion'),
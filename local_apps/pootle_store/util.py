@@ -23,7 +23,10 @@ import os
 
 from django.conf import settings
 
+from translate.misc.hash import md5_f
+
 from pootle_misc.aggregate import sum_column
+from pootle_store.fields import PLURAL_PLACEHOLDER
 from pootle_misc.util import dictsum
 
 # Unit States
@@ -69,8 +72,47 @@ empty_quickstats = {'fuzzy': 0,
                     'translatedtargetwords': 0,
                     'untranslated': 0,
                     'untranslatedsourcewords': 0,
+                    'suggestions': 0,
                     'errors': 0}
 
+quickstats_keys = ('total', 'totalsourcewords',
+                   'untranslated', 'untranslatedsourcewords',
+                   'fuzzy', 'fuzzysourcewords',
+                   'translated', 'translatedsourcewords', 'translatedtargetwords',
+                   'suggestions')
+"""quickstats that can be derived from unit state, word counts and
+suggestion counters"""
+
+def unit_stats(state, source_wordcount, target_wordcount, suggestion_count=0):
+    """contribution of a single unit to the quickstats of its store"""
+    stats = {}
+    if state <= OBSOLETE:
+        return stats
+    stats['total'] = 1
+    stats['totalsourcewords'] = source_wordcount
+    if suggestion_count:
+        stats['suggestions'] = suggestion_count
+    if state == UNTRANSLATED:
+        stats['untranslated'] = 1
+        stats['untranslatedsourcewords'] = source_wordcount
+    elif state == FUZZY:
+        stats['fuzzy'] = 1
+        stats['fuzzysourcewords'] = source_wordcount
+    elif state == TRANSLATED:
+        stats['translated'] = 1
+        stats['translatedsourcewords'] = source_wordcount
+        stats['translatedtargetwords'] = target_wordcount
+    return stats
+
+def stats_delta(old, new):
+    """difference between two stats dictionaries, without zero entries"""
+    delta = {}
+    for key in set(old) | set(new):
+        value = new.get(key, 0) - old.get(key, 0)
+        if value:
+            delta[key] = value
+    return delta
+
 def statssum(queryset, empty_stats=empty_quickstats):
     totals = empty_stats
     for item in queryset:
@@ -95,7 +137,7 @@ def completestatssum(queryset, empty_stats=empty_completestats):
 def calculate_stats(units):
     """calculate translation statistics for given unit queryset"""
     total = sum_column(units,
-                       ['source_wordcount'], count=True)
+                       ['source_wordcount', 'suggestion_count'], count=True)
     untranslated = sum_column(units.filter(state=UNTRANSLATED),
                               ['source_wordcount'], count=True)
     fuzzy = sum_column(units.filter(state=FUZZY),
@@ -125,4 +167,69 @@ def calculate_stats(units):
     else:
         result['translatedsourcewords'] = translated['source_wordcount']
         result['translatedtargetwords'] = translated['target_wordcount']
+    result['suggestions'] = total['suggestion_count'] or 0
     return result
+
+def _strings(value):
+    """unicode strings of a plain or multi string, with empty
+    translations reduced to no strings at all"""
+    if value is None:
+        return []
+    strings = getattr(value, 'strings', [value])
+    if strings and strings[-1] == PLURAL_PLACEHOLDER:
+        # plural with a single form, as assigned by Unit.update()
+        strings = strings[:-1]
+    if not filter(None, strings):
+        return []
+    return [unicode(string) for string in strings]
+
+def unit_fingerprint(unit):
+    """hash of the fields Unit.update() and Unit.sync() compare.
+
+    computed the same way for database and toolkit units, so units that
+    didn't change between the file and the database can be skipped
+    without loading them"""
+    parts = [unicode(unit.getid()) or unicode(unit.source),
+             u'\1'.join(_strings(unit.source)),
+             u'\1'.join(_strings(unit.target)),
+             unit.getnotes(origin="developer") or u'',
+             unit.getnotes(origin="translator") or u'',
+             u'\n'.join(unit.getlocations()),
+             unit.getcontext() or u'',
+             unit.isfuzzy() and u'fuzzy' or u'',
+             unit.isobsolete() and u'obsolete' or u'',
+             unit.hasplural() and u'plural' or u'',
+             ]
+    return md5_f(u'\0'.join(parts).encode('utf-8')).hexdigest()
+
+SEARCH_FIELDS = {'source': 1,
+                 'target': 2,
+                 'notes': 3,
+                 'locations': 4,
+                 }
+"""codes of the fields searched in the editor, as stored in the
+search index"""
+
+def unit_search_texts(unit):
+    """texts of the searchable fields of a database unit by search
+    field code"""
+    notes = [note for note in (unit.developer_comment, unit.translator_comment) if note]
+    return {SEARCH_FIELDS['source']: u'\n'.join(_strings(unit.source_f)),
+            SEARCH_FIELDS['target']: u'\n'.join(_strings(unit.target_f)),
+            SEARCH_FIELDS['notes']: u'\n'.join(notes),
+            SEARCH_FIELDS['locations']: unit.locations or u'',
+            }
+
+def text_trigrams(text):
+    """set of the trigrams of text without whitespace, lower cased and
+    packed into integers.
+
+    every text containing a word contains all the trigrams of the
+    word, so they narrow down substring searches"""
+    text = text.lower()
+    trigrams = set()
+    for i in xrange(len(text) - 2):
+        trigram = text[i:i+3]
+        if trigram.split() == [trigram]:
+            trigrams.add((ord(trigram[0]) << 42) | (ord(trigram[1]) << 21) | ord(trigram[2]))
+    return trigrams
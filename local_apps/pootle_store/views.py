@@ -19,19 +19,22 @@
 # along with this program; if not, see <http://www.gnu.org/licenses/>.
 
 import os
+import re
 import logging
 import tempfile
 import shutil
+from array import array
 
 from translate.storage.poxliff import PoXliffFile
 from translate.lang import data
+from translate.misc.hash import md5_f
 
 from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, HttpResponseBadRequest, Http404
 from django.shortcuts import render_to_response
 from django.template import loader, RequestContext
-from django.utils.translation import to_locale, ugettext as _
+from django.utils.translation import to_locale, get_language, ugettext as _
 from django.utils.translation import ungettext
 from django.utils.translation.trans_real import parse_accept_lang_header
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
@@ -39,20 +42,23 @@ from django.core.cache import cache
 from django.utils import simplejson
 from django.views.decorators.cache import never_cache
 from django.utils.encoding import iri_to_uri
+from django.db.models import Q
 
 from pootle_misc.baseurl import redirect
 from pootle_app.models.permissions import get_matching_permissions, check_permission, check_profile_permission
-from pootle_misc.util import paginate, ajax_required
+from pootle_misc.util import paginate, ajax_required, get_generation
 from pootle_profile.models import get_profile
+from pootle_language.models import Language
+from pootle_translationproject.models import TranslationProject
 from pootle_translationproject.forms import SearchForm
 from pootle_statistics.models import Submission
-from pootle_app.models import Suggestion as SuggestionStat
+from pootle_app.models import Suggestion as SuggestionStat, Directory
 from pootle_app.project_tree import ensure_target_dir_exists
 
-from pootle_store.models import Store, Unit
+from pootle_store.models import Store, Unit, TMMatcher, filter_failing_checks, filter_trigrams
 from pootle_store.forms import unit_form_factory, highlight_whitespace
-from pootle_store.templatetags.store_tags import fancy_highlight, find_altsrcs, get_sugg_list, highlight_diffs, pluralize_source, pluralize_target
-from pootle_store.util import UNTRANSLATED, FUZZY, TRANSLATED, absolute_real_path
+from pootle_store.templatetags.store_tags import fancy_highlight, find_altsrcs, find_altsrcs_batch, get_sugg_list, highlight_diffs, pluralize_source, pluralize_target
+from pootle_store.util import OBSOLETE, UNTRANSLATED, FUZZY, TRANSLATED, absolute_real_path
 from pootle_store.filetypes import factory_classes, is_monolingual
 from pootle_store.signals import translation_submitted
 
@@ -182,37 +188,114 @@ def get_alt_src_langs(request, profile, translation_project):
     return langs
 
 def get_non_indexed_search_step_query(form, units_queryset):
+    """Narrows down units query to units containing all the words of the
+    search string in any of the searched fields, using the trigram index
+    to avoid scanning all units"""
     words = form.cleaned_data['search'].split()
     result = units_queryset.none()
 
     if 'source' in form.cleaned_data['sfields']:
         subresult = units_queryset
         for word in words:
-            subresult = subresult.filter(source_f__icontains=word)
+            subresult = filter_trigrams(subresult, 'source', word).filter(source_f__icontains=word)
         result = result | subresult
 
     if 'target' in form.cleaned_data['sfields']:
         subresult = units_queryset
         for word in words:
-            subresult = subresult.filter(target_f__icontains=word)
+            subresult = filter_trigrams(subresult, 'target', word).filter(target_f__icontains=word)
         result = result | subresult
 
     if 'notes' in form.cleaned_data['sfields']:
         translator_subresult = units_queryset
         developer_subresult = units_queryset
         for word in words:
-            translator_subresult = translator_subresult.filter(translator_comment__icontains=word)
-            developer_subresult = developer_subresult.filter(developer_comment__icontains=word)
+            translator_subresult = filter_trigrams(translator_subresult, 'notes', word).filter(translator_comment__icontains=word)
+            developer_subresult = filter_trigrams(developer_subresult, 'notes', word).filter(developer_comment__icontains=word)
         result = result | translator_subresult | developer_subresult
 
     if 'locations' in form.cleaned_data['sfields']:
         subresult = units_queryset
         for word in words:
-            subresult = subresult.filter(locations__icontains=word)
+            subresult = filter_trigrams(subresult, 'locations', word).filter(locations__icontains=word)
         result = result | subresult
 
     return result
 
+def _make_search_query(indexer, form, paths):
+    searchparts = []
+    # Split the search expression into single words. Otherwise xapian and
+    # lucene would interprete the whole string as an "OR" combination of
+    # words instead of the desired "AND".
+    for word in form.cleaned_data['search'].split():
+        # Generate a list for the query based on the selected fields
+        word_querylist = [(field, word) for field in form.cleaned_data['sfields']]
+        textquery = indexer.make_query(word_querylist, False)
+        searchparts.append(textquery)
+
+    path_querylist = [('pofilename', pootle_path) for pootle_path in paths]
+    pathquery = indexer.make_query(path_querylist, False)
+    searchparts.append(pathquery)
+    return indexer.make_query(searchparts, True)
+
+def _get_search_handle(translation_project, form, paths):
+    """
+    Returns a key for the indexer results of a search, which changes
+    when the units or the search index of C{translation_project} change.
+    """
+    signature = (paths, form.cleaned_data['search'].split(), form.cleaned_data['sfields'],
+                 translation_project.get_mtime(), translation_project.get_index_mark())
+    return "search:%s" % md5_f(repr(signature)).hexdigest()
+
+def _get_match_dbid(match):
+    """
+    Returns the unit id stored in the document of an indexer match, or
+    C{None}.
+    """
+    document = match['document']
+    if hasattr(document, 'termlist'):
+        # xapian stores fields as terms prefixed with the upper cased
+        # field name
+        for item in document.termlist():
+            if item.term.startswith('DBID') and item.term[4:].isdigit():
+                return int(item.term[4:])
+        return None
+    # lucene documents hold stored fields by name
+    value = document.get('dbid')
+    return value and int(value) or None
+
+def _get_ranked_dbids(indexer, query, start, limit):
+    """
+    Returns the unit ids of up to C{limit} matches of C{query} starting at
+    match C{start}, best ranked first, and the estimated number of
+    matches. Only the requested page is read from the indexer.
+    """
+    size, total, matches = indexer.get_query_result(query).get_matches(start, limit)
+    dbids = [_get_match_dbid(match) for match in matches]
+    return [dbid for dbid in dbids if dbid is not None], total
+
+def _get_ranked_page(translation_project, form, units_queryset, start, limit):
+    """
+    Returns the unit ids of up to C{limit} indexer hits of a search
+    starting at hit C{start} and the estimated number of hits. Each page
+    is cached as packed ids under the handle of the search.
+    """
+    paths = list(units_queryset.order_by().values_list('store__pootle_path', flat=True).distinct())
+    key = "%s:%d:%d" % (_get_search_handle(translation_project, form, paths), start, limit)
+    cached = cache.get(key)
+    if cached is not None:
+        total, packed = cached
+        return array('i', packed).tolist(), total
+
+    indexer = translation_project.indexer
+    dbids, total = _get_ranked_dbids(indexer, _make_search_query(indexer, form, paths), start, limit)
+    cache.set(key, (total, array('i', dbids).tostring()), settings.OBJECT_CACHE_TIMEOUT)
+    return dbids, total
+
+SEARCH_ID_LIMIT = 500
+"""best ranked indexer hits the editor steps through, few enough to
+narrow units down by id in a single query on any database"""
+
 def get_search_step_query(translation_project, form, units_queryset):
     """Narrows down units query to units matching search string"""
 
@@ -223,34 +306,72 @@ def get_search_step_query(translation_project, form, units_queryset):
     logging.debug(u"Found %s indexer for %s, using indexed search",
                   translation_project.indexer.INDEX_DIRECTORY_NAME, translation_project)
 
-    word_querylist = []
-    words = form.cleaned_data['search'].split()
-    fields = form.cleaned_data['sfields']
-    paths = units_queryset.order_by().values_list('store__pootle_path', flat=True).distinct()
-    path_querylist = [('pofilename', pootle_path) for pootle_path in paths.iterator()]
-    cache_key = "search:%s" % str(hash((repr(path_querylist), translation_project.get_mtime(), repr(words), repr(fields))))
-
-    dbids = cache.get(cache_key)
-    if dbids is None:
-        searchparts = []
-        # Split the search expression into single words. Otherwise xapian and
-        # lucene would interprete the whole string as an "OR" combination of
-        # words instead of the desired "AND".
-        for word in words:
-            # Generate a list for the query based on the selected fields
-            word_querylist = [(field, word) for field in fields]
-            textquery = translation_project.indexer.make_query(word_querylist, False)
-            searchparts.append(textquery)
-
-        pathquery = translation_project.indexer.make_query(path_querylist, False)
-        searchparts.append(pathquery)
-        limitedquery = translation_project.indexer.make_query(searchparts, True)
-
-        result = translation_project.indexer.search(limitedquery, ['dbid'])
-        dbids = [int(item['dbid'][0]) for item in result[:999]]
-        cache.set(cache_key, dbids, settings.OBJECT_CACHE_TIMEOUT)
+    dbids, total = _get_ranked_page(translation_project, form, units_queryset, 0, SEARCH_ID_LIMIT)
+    if total > len(dbids):
+        logging.debug(u"Stepping through the best %d of %d hits in %s", len(dbids), total, translation_project)
     return units_queryset.filter(id__in=dbids)
 
+def search_units(request, units_queryset):
+    """
+    @return: An object in JSON notation that contains a page of the units
+    matching the C{search} and C{sfields} parameters, best matches first
+    if there is a search index, a C{cursor} to pass back to get the
+    following page, and whether there are C{more} units.
+
+    With a search index the estimated C{total} number of hits is returned
+    too.
+    """
+    form = SearchForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest("Invalid search.")
+
+    translation_project = request.translation_project
+    limit = request.profile.get_unit_rows()
+    cursor = request.GET.get('cursor', '')
+    json = {}
+
+    if translation_project.indexer is not None:
+        # cursor is the rank of the next hit
+        try:
+            start = cursor and int(cursor[1:]) or 0
+        except ValueError:
+            raise Http404
+        if cursor and not cursor.startswith('r'):
+            raise Http404
+        dbids, total = _get_ranked_page(translation_project, form, units_queryset, start, limit)
+        units = dict((unit.id, unit) for unit in units_queryset.filter(id__in=dbids).select_related('store'))
+        units = [units[dbid] for dbid in dbids if dbid in units]
+        more = start + limit < total
+        next_cursor = more and "r%d" % (start + limit) or None
+        json["total"] = total
+    else:
+        # cursor is the id of the last unit returned
+        results = get_non_indexed_search_step_query(form, units_queryset).order_by(*UNIT_ORDER)
+        if cursor:
+            if not cursor.startswith('u'):
+                raise Http404
+            try:
+                cursor_unit = units_queryset.select_related('store').get(id=cursor[1:])
+            except (Unit.DoesNotExist, ValueError):
+                raise Http404
+            units, more = _get_units_page(results, cursor_unit, limit)
+        else:
+            units = list(results[:limit+1])
+            more = len(units) > limit
+            units = units[:limit]
+        next_cursor = more and "u%d" % units[-1].id or None
+
+    json["units"] = _build_units_list(units)
+    json["cursor"] = next_cursor
+    json["more"] = more
+    response = jsonify(json)
+    return HttpResponse(response, mimetype="application/json")
+
+@ajax_required
+@get_store_context('view')
+def search_units_store(request, store):
+    return search_units(request, store.units)
+
 def get_step_query(request, units_queryset):
     """Narrows down unit query to units matching conditions in GET and POST"""
     if 'unitstates' in request.GET:
@@ -271,16 +392,14 @@ def get_step_query(request, units_queryset):
         if matchnames:
             match_queryset = units_queryset.none()
             if 'hassuggestion' in matchnames:
-                #FIXME: is None the most efficient query
-                match_queryset = units_queryset.exclude(suggestion=None)
+                match_queryset = units_queryset.filter(suggestion_count__gt=0)
                 matchnames.remove('hassuggestion')
             elif 'ownsuggestion' in matchnames:
                 match_queryset = units_queryset.filter(suggestion__user=request.profile).distinct()
                 matchnames.remove('ownsuggestion')
 
             if matchnames:
-                match_queryset = match_queryset | units_queryset.filter(
-                    qualitycheck__false_positive=False, qualitycheck__name__in=matchnames)
+                match_queryset = match_queryset | filter_failing_checks(units_queryset, matchnames)
             units_queryset = match_queryset
 
     if 'search' in request.GET and 'sfields' in request.GET:
@@ -340,28 +459,60 @@ def _filter_ctxt_units(units_qs, unit, limit, gap=0):
     result['after'] = _build_units_list(after)
     return result
 
+def _unit_fragment_key(unit, language):
+    # some databases store mtime with a resolution of one second, the
+    # digest of everything the fragment shows tells apart changes made
+    # within the same second, and is the same in every process
+    rendered = (unit.id, unit.state, [unicode(string) for string in getattr(unit.source_f, 'strings', [unit.source_f])],
+                [unicode(string) for string in getattr(unit.target_f, 'strings', [unit.target_f])])
+    return "unitfragment:%d:%s:%s:%s" % (unit.id, unit.mtime.strftime("%Y%m%d%H%M%S%f"),
+                                        md5_f(repr(rendered)).hexdigest(), language)
+
+def _render_unit(unit):
+    """
+    Renders the source and target texts of C{unit} for the unit list.
+    """
+    source_unit = []
+    target_unit = []
+    for i, source, title in pluralize_source(unit):
+        unit_dict = {'text': fancy_highlight(source)}
+        if title:
+            unit_dict["title"] = title
+        source_unit.append(unit_dict)
+    for i, target, title in pluralize_target(unit):
+        unit_dict = {'text': fancy_highlight(target)}
+        if title:
+            unit_dict["title"] = title
+        target_unit.append(unit_dict)
+    return {'isfuzzy': unit.isfuzzy(),
+            'source': source_unit,
+            'target': target_unit}
+
 def _build_units_list(units, reverse=False):
     """
     Given a list/queryset of units, builds a list with the unit data
     contained in a dictionary ready to be returned as JSON.
 
+    Rendered texts are cached until the unit changes, so only new or
+    changed units are rendered again.
+
     @return: A list with unit id, source, and target texts. In case of
     having plural forms, a title for the plural form is also provided.
     """
+    if hasattr(units, 'iterator'):
+        units = units.iterator()
+    units = list(units)
+    language = get_language()
+    keys = [_unit_fragment_key(unit, language) for unit in units]
+    fragments = cache.get_many(keys)
+    missing = {}
+
     return_units = []
-    for unit in units.iterator():
-        source_unit = []
-        target_unit = []
-        for i, source, title in pluralize_source(unit):
-            unit_dict = {'text': fancy_highlight(source)}
-            if title:
-                unit_dict["title"] = title
-            source_unit.append(unit_dict)
-        for i, target, title in pluralize_target(unit):
-            unit_dict = {'text': fancy_highlight(target)}
-            if title:
-                unit_dict["title"] = title
-            target_unit.append(unit_dict)
+    for unit, key in zip(units, keys):
+        fragment = fragments.get(key)
+        if fragment is None:
+            fragment = _render_unit(unit)
+            missing[key] = fragment
         prev = None
         next = None
         if return_units:
@@ -371,12 +522,13 @@ def _build_units_list(units, reverse=False):
             else:
                 return_units[-1]['next'] = unit.id
                 prev = return_units[-1]['id']
-        return_units.append({'id': unit.id,
-                             'isfuzzy': unit.isfuzzy(),
-                             'prev': prev,
-                             'next': next,
-                             'source': source_unit,
-                             'target': target_unit})
+        unit_dict = {'id': unit.id,
+                     'prev': prev,
+                     'next': next}
+        unit_dict.update(fragment)
+        return_units.append(unit_dict)
+    if missing:
+        cache.set_many(missing, settings.OBJECT_CACHE_TIMEOUT)
     return return_units
 
 def _build_pager_dict(pager):
@@ -399,7 +551,55 @@ def _get_index_in_qs(qs, unit):
 
     @return: Integer value representing the position of the unit C{unit}.
     """
-    return qs.filter(index__lt=unit.index).count()
+    return qs.filter(_units_before_q(unit)).count()
+
+UNIT_ORDER = ('store__pootle_path', 'index')
+"""order of units in the editor, also the key of unit list cursors"""
+
+def _units_before_q(unit):
+    return Q(store__pootle_path__lt=unit.store.pootle_path) | \
+           Q(store__pootle_path=unit.store.pootle_path, index__lt=unit.index)
+
+def _units_after_q(unit):
+    return Q(store__pootle_path__gt=unit.store.pootle_path) | \
+           Q(store__pootle_path=unit.store.pootle_path, index__gt=unit.index)
+
+def _get_units_page(qs, unit, limit, reverse=False):
+    """
+    Returns up to C{limit} units of C{qs} following C{unit}, or preceding it
+    if C{reverse} is set, using range queries instead of offsets.
+
+    @return: A list of units in editor order, and whether there are more
+    units beyond them.
+    """
+    if reverse:
+        units = list(qs.filter(_units_before_q(unit)).order_by(*['-' + key for key in UNIT_ORDER])[:limit+1])
+    else:
+        units = list(qs.filter(_units_after_q(unit)).order_by(*UNIT_ORDER)[:limit+1])
+    more = len(units) > limit
+    units = units[:limit]
+    if reverse:
+        units.reverse()
+    return units, more
+
+PAGING_PARAMETERS = ('page', 'uid', 'after', 'before', 'pager', 'meta', 'count')
+
+def _get_units_count(request, qs):
+    """
+    Returns the number of units in C{qs}, cached per filter until units
+    of the translation project change.
+    """
+    params = sorted((key, value) for key, value in request.GET.iteritems() if key not in PAGING_PARAMETERS)
+    if 'ownsuggestion' in request.GET.get('matchnames', ''):
+        params.append(('user', request.profile.id))
+    signature = md5_f(repr((request.path, params))).hexdigest()
+    path = request.translation_project.pootle_path
+    key = iri_to_uri("%s:%d:unitcount:%s" % (path, get_generation(path), signature))
+    count = cache.get(key)
+    if count is None:
+        count = qs.count()
+        cache.set(key, count, settings.OBJECT_CACHE_TIMEOUT)
+    return count
 
 def get_view_units(request, units_queryset, limit=0):
     """
@@ -408,6 +608,10 @@ def get_view_units(request, units_queryset, limit=0):
 
     If asked by using the 'meta' and 'pager' parameters, metadata and pager
     information will be calculated and returned too.
+
+    Given 'after' or 'before' a unit id, the units following or preceding
+    that unit are returned instead of a page, along with cursors for the
+    neighbouring units. The total is only counted if 'count' is given.
     """
     current_unit = None
     json = {}
@@ -420,7 +624,7 @@ def get_view_units(request, units_queryset, limit=0):
     if not limit:
         limit = request.profile.get_unit_rows()
 
-    step_queryset = get_step_query(request, units_queryset)
+    step_queryset = get_step_query(request, units_queryset).order_by(*UNIT_ORDER)
 
     # Return metadata it has been explicitely requested
     if request.GET.get('meta', False):
@@ -430,17 +634,37 @@ def get_view_units(request, units_queryset, limit=0):
                         "target_lang": tp.language.code,
                         "target_dir": tp.language.get_direction()}
 
+    # Cursor based paging: the units after or before a given unit
+    cursor = request.GET.get('after', None) or request.GET.get('before', None)
+    if cursor:
+        try:
+            cursor_unit = units_queryset.select_related('store').get(id=cursor)
+        except (Unit.DoesNotExist, ValueError):
+            raise Http404
+        reverse = 'before' in request.GET
+        units, more = _get_units_page(step_queryset, cursor_unit, limit, reverse)
+        json["units"] = _build_units_list(units)
+        json["cursor"] = {"more": more}
+        if units:
+            json["cursor"]["before"] = units[0].id
+            json["cursor"]["after"] = units[-1].id
+        if request.GET.get('count', False):
+            json["count"] = _get_units_count(request, step_queryset)
+        response = jsonify(json)
+        return HttpResponse(response, mimetype="application/json")
+
     # Maybe we are trying to load directly a specific unit, so we have
     # to calculate its page number
     uid = request.GET.get('uid', None)
     if uid:
-        current_unit = units_queryset.get(id=uid)
+        current_unit = units_queryset.select_related('store').get(id=uid)
         preceding = _get_index_in_qs(step_queryset, current_unit)
         page = preceding / limit + 1
     else:
         page = None
 
-    pager = paginate(request, step_queryset, items=limit, page=page)
+    pager = paginate(request, step_queryset, items=limit, page=page,
+                     count=_get_units_count(request, step_queryset))
 
     json["units"] = _build_units_list(pager.object_list)
 
@@ -489,19 +713,30 @@ def get_more_context(request, unit):
     response = jsonify(json)
     return HttpResponse(response, status=rcode, mimetype="application/json")
 
-@never_cache
-@ajax_required
-@get_unit_context('view')
-def get_edit_unit(request, unit):
+def _get_editor_context(request):
     """
-    Given a store path C{pootle_path} and unit id C{uid}, gathers all the
-    necessary information to build the editing widget.
+    Lookups shared by all the unit editors rendered for C{request}.
+    """
+    translation_project = request.translation_project
+    return {'alt_src_langs': get_alt_src_langs(request, request.profile, translation_project),
+            'form_classes': {},
+            'permissions': {}}
 
-    @return: A templatised editing widget is returned within the C{editor}
-    variable and paging information is also returned if the page number has
-    changed.
+def _get_permissions(request, editor_context, directory):
+    """
+    Returns the permissions of the user on C{directory}, checked once per
+    directory for all units rendered with C{editor_context}.
     """
+    permissions = editor_context['permissions']
+    if directory.id not in permissions:
+        permissions[directory.id] = dict((code, check_profile_permission(request.profile, code, directory))
+                                         for code in ("view", "translate", "suggest", "review"))
+    return permissions[directory.id]
 
+def _render_editor(request, unit, editor_context, altsrcs):
+    """
+    Renders the editing widget and breadcrumbs of C{unit}.
+    """
     json = {}
 
     translation_project = request.translation_project
@@ -511,13 +746,18 @@ def get_edit_unit(request, unit):
         snplurals = len(unit.source.strings)
     else:
         snplurals = None
-    form_class = unit_form_factory(language, snplurals)
-    form = form_class(instance=unit)
+    form_classes = editor_context['form_classes']
+    if snplurals not in form_classes:
+        form_classes[snplurals] = unit_form_factory(language, snplurals)
+    form = form_classes[snplurals](instance=unit)
     store = unit.store
     directory = store.parent
     profile = request.profile
-    alt_src_langs = get_alt_src_langs(request, profile, translation_project)
-    project = translation_project.project
+    permissions = _get_permissions(request, editor_context, directory)
+    if unit.suggestion_count:
+        suggestions = get_sugg_list(unit)
+    else:
+        suggestions = []
     template_vars = {'unit': unit,
                      'form': form,
                      'store': store,
@@ -526,11 +766,11 @@ def get_edit_unit(request, unit):
                      'user': request.user,
                      'language': language,
                      'source_language': translation_project.project.source_language,
-                     'cantranslate': check_profile_permission(profile, "translate", directory),
-                     'cansuggest': check_profile_permission(profile, "suggest", directory),
-                     'canreview': check_profile_permission(profile, "review", directory),
-                     'altsrcs': find_altsrcs(unit, alt_src_langs, store=store, project=project),
-                     'suggestions': get_sugg_list(unit)}
+                     'cantranslate': permissions["translate"],
+                     'cansuggest': permissions["suggest"],
+                     'canreview': permissions["review"],
+                     'altsrcs': altsrcs,
+                     'suggestions': suggestions}
 
     t = loader.get_template('unit/edit.html')
     c = RequestContext(request, template_vars)
@@ -540,13 +780,138 @@ def get_edit_unit(request, unit):
     t = loader.get_template('store/storecrumbs.html')
     json['storecrumbs'] = t.render(c)
 
-    rcode = 200
     # Return context rows if filtering is applied
     if _is_filtered(request) or request.GET.get('filter', 'all') != 'all':
         json['ctxt'] = _filter_ctxt_units(store.units, unit, 2)
+    return json
+
+@never_cache
+@ajax_required
+@get_unit_context('view')
+def get_edit_unit(request, unit):
+    """
+    Given a store path C{pootle_path} and unit id C{uid}, gathers all the
+    necessary information to build the editing widget.
+
+    @return: A templatised editing widget is returned within the C{editor}
+    variable and paging information is also returned if the page number has
+    changed.
+    """
+    editor_context = _get_editor_context(request)
+    altsrcs = find_altsrcs(unit, editor_context['alt_src_langs'], store=unit.store,
+                           project=request.translation_project.project)
+    json = _render_editor(request, unit, editor_context, altsrcs)
+    rcode = 200
     response = jsonify(json)
     return HttpResponse(response, status=rcode, mimetype="application/json")
 
+@never_cache
+@ajax_required
+@get_unit_context('view')
+def get_edit_units(request, unit, count=0):
+    """
+    Editing widgets for unit C{uid} and the C{count} units following it
+    within the active filter, so the client can move forward without a
+    request for every unit.
+
+    The units are taken from the store of C{uid}, or from the directory
+    of the translation project given as C{path}.
+
+    @return: An object in JSON notation that contains a list of C{units}
+    with their C{id} and editing widgets, and whether there are C{more}
+    units after them.
+    """
+    translation_project = request.translation_project
+    path = request.GET.get('path', unit.store.pootle_path)
+    if path == unit.store.pootle_path:
+        units_queryset = unit.store.units
+    elif path.endswith('/') and path.startswith(translation_project.pootle_path):
+        directory = get_object_or_404(Directory, pootle_path=path)
+        units_queryset = directory.descendant_units().filter(state__gt=OBSOLETE,
+                                                             store__translation_project=translation_project)
+    else:
+        raise Http404
+
+    try:
+        count = int(count)
+    except ValueError:
+        count = 0
+    limit = request.profile.get_unit_rows()
+    if not count or count > limit:
+        count = limit
+
+    step_queryset = get_step_query(request, units_queryset).select_related('store', 'store__parent')
+    units, more = _get_units_page(step_queryset, unit, count)
+    editor_context = _get_editor_context(request)
+    # the view permission was only checked for the store of uid
+    units = [editor_unit for editor_unit in units
+             if _get_permissions(request, editor_context, editor_unit.store.parent)["view"]]
+    units.insert(0, unit)
+
+    altsrcs = find_altsrcs_batch(units, editor_context['alt_src_langs'], translation_project.project)
+    json = {'units': [], 'more': more}
+    for editor_unit in units:
+        editor = _render_editor(request, editor_unit, editor_context, altsrcs[editor_unit.id])
+        editor['id'] = editor_unit.id
+        json['units'].append(editor)
+    response = jsonify(json)
+    return HttpResponse(response, mimetype="application/json")
+
+
+TM_MAX_CANDIDATES = 20
+"""most suggestions returned by the translation memory service"""
+
+JSONP_CALLBACK_RE = re.compile(r'^[A-Za-z_$][\w$.]*$')
+
+def get_tm_units(request, source_language, target_language, text):
+    """
+    Translation memory service answering like an amaGama server, from the
+    translations of the projects in C{source_language} to
+    C{target_language} the user may view.
+
+    Accepts the C{min_similarity} and C{max_candidates} parameters, and
+    C{jsoncallback} to be called with the results.
+
+    @return: A list in JSON notation of the most similar units, each with
+    its C{source}, C{target}, and similarity as C{quality} and C{rank}.
+    """
+    language = get_object_or_404(Language, code=target_language)
+    try:
+        min_similarity = max(30, min(100, int(request.GET.get('min_similarity', 70))))
+        max_candidates = max(1, min(TM_MAX_CANDIDATES, int(request.GET.get('max_candidates', 5))))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid parameters.")
+    callback = request.GET.get('jsoncallback', None)
+    if callback is not None and not JSONP_CALLBACK_RE.match(callback):
+        return HttpResponseBadRequest("Invalid callback.")
+
+    profile = get_profile(request.user)
+    translation_projects = TranslationProject.objects.filter(language=language,
+                                                             project__source_language__code=source_language)
+    tp_ids = [tp.id for tp in translation_projects.select_related('directory').iterator()
+              if check_profile_permission(profile, 'view', tp.directory)]
+
+    signature = md5_f(repr((text, tp_ids, min_similarity, max_candidates))).hexdigest()
+    path = iri_to_uri(language.pootle_path)
+    key = "%s:%d:tmunits:%s" % (path, get_generation(path), signature)
+    json = cache.get(key)
+    if json is None:
+        json = []
+        if tp_ids:
+            matcher = TMMatcher(language.id, max_candidates=max_candidates, min_similarity=min_similarity,
+                                stores=Store.objects.filter(translation_project__in=tp_ids))
+            for quality, unit in matcher.scored_matches(text):
+                json.append({'source': unicode(unit.source),
+                             'target': unicode(unit.target),
+                             'quality': quality,
+                             'rank': quality})
+        cache.set(key, json, settings.OBJECT_CACHE_TIMEOUT)
+
+    response = jsonify(json)
+    if callback is not None:
+        return HttpResponse("%s(%s)" % (callback, response), mimetype="application/javascript")
+    return HttpResponse(response, mimetype="application/json")
+
 
 def get_failing_checks(request, pathobj):
     """
@@ -554,10 +919,11 @@ def get_failing_checks(request, pathobj):
 
     @return: JSON string representing action status and depending on success,
     returns an error message or a list containing the the name and number of
-    failing checks.
+    failing checks. C{pending} is set while some checks haven't run yet.
     """
     json = {}
     checkopts = []
+    json['pending'] = pathobj.has_pending_checks()
     # Borrowed from pootle_app.views.language.item_dict.getcheckdetails
     property_stats = pathobj.getcompletestats()
     quick_stats = pathobj.getquickstats()
@@ -721,6 +1087,9 @@ def reject_qualitycheck(request, unit, checkid):
             check = unit.qualitycheck_set.get(id=checkid)
             check.false_positive = True
             check.save()
+            unit.update_check_mask()
+            if unit.checks_counted():
+                unit.store.update_check_stats({check.name: -1})
             # update timestamp
             unit.save()
         except ObjectDoesNotExist:
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2010 Zuza Software Foundation
+#
+# This file is part of Pootle.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>.
+
+"""watch PODIRECTORY for changed translation files using Linux's
+inotify, so files in the parse pool need not be stat'ed on every
+access. enabled with WATCH_TRANSLATION_FILES, requires pyinotify"""
+
+import os
+import logging
+import threading
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+class FileWatcher(object):
+    """keeps track of files under a directory that changed since they
+    were last looked at.
+
+    callback is called from the watcher thread with the real path of
+    every changed file, or with None if events were lost and any file
+    may have changed."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.root = None
+        self._stale = set()
+        self._notifier = None
+        self._lock = threading.Lock()
+
+    def _get_active(self):
+        return self._notifier is not None
+    active = property(_get_active)
+
+    def start(self, directory):
+        """start watching directory, returns False if inotify isn't
+        available"""
+        if pyinotify is None:
+            return False
+        self._lock.acquire()
+        try:
+            if self._notifier is not None:
+                return True
+            self.root = os.path.join(os.path.realpath(directory), '')
+            watch_manager = pyinotify.WatchManager()
+            notifier = pyinotify.ThreadedNotifier(watch_manager, _EventHandler(watcher=self))
+            notifier.setDaemon(True)
+            notifier.start()
+            mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO | pyinotify.IN_MOVED_FROM | \
+                   pyinotify.IN_DELETE | pyinotify.IN_ATTRIB
+            watch_manager.add_watch(self.root, mask, rec=True, auto_add=True)
+            self._notifier = notifier
+            logging.debug(u"Watching %s for changes", self.root)
+            return True
+        finally:
+            self._lock.release()
+
+    def is_fresh(self, realpath):
+        """has the file stayed unchanged since it was last looked at"""
+        return self.root is not None and realpath.startswith(self.root) and realpath not in self._stale
+
+    def forget(self, realpath):
+        """file is about to be looked at, start tracking changes again"""
+        self._stale.discard(realpath)
+
+    def mark_stale(self, realpath):
+        self._stale.add(realpath)
+
+    def changed(self, realpath):
+        if realpath is not None:
+            self.mark_stale(realpath)
+        try:
+            self.callback(realpath)
+        except Exception, e:
+            logging.error(u"Failed to handle change of %s:\n%s", realpath, e)
+
+
+if pyinotify is not None:
+    class _EventHandler(pyinotify.ProcessEvent):
+        def my_init(self, watcher):
+            self.watcher = watcher
+
+        def process_default(self, event):
+            if not event.dir:
+                self.watcher.changed(event.pathname)
+
+        def process_IN_Q_OVERFLOW(self, event):
+            logging.warning(u"Lost track of changes to translation files")
+            self.watcher.changed(None)
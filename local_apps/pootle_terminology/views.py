@@ -106,6 +106,7 @@ def extract(request, translation_project):
             unit.save()
             for suggestion in unit.pending_suggestions:
                 unit.add_suggestion(suggestion)
+        store.refresh_stats()
 
         # unlock file
         store.state = oldstate
@@ -25,6 +25,8 @@ import zipfile
 import logging
 import tempfile
 import shutil
+import threading
+import datetime
 
 from django.conf                   import settings
 from django.db                     import models, IntegrityError
@@ -36,15 +38,13 @@ from translate.filters import checks
 from translate.search  import match, indexing
 from translate.storage import versioncontrol
 from translate.storage.base import ParseError
-from translate.misc.lru import LRUCachingDict
 
 from pootle.scripts                import hooks
 from pootle_misc.util import getfromcache, dictsum, deletefromcache
+from pootle_misc.sizedlru import SizedLRUDict
 from pootle_misc.baseurl import l
-from pootle_misc.aggregate import group_by_count, max_column
-from pootle_store.util import calculate_stats
-from pootle_store.models           import Store, Unit, QualityCheck, PARSED, CHECKED
-from pootle_store.util             import relative_real_path, absolute_real_path, OBSOLETE
+from pootle_store.models           import Store, Unit, UnitChange, PARSED, CHECKED, have_indexer
+from pootle_store.util             import relative_real_path, absolute_real_path
 from pootle_store.util import empty_quickstats, empty_completestats
 
 from pootle_app.lib.util           import RelatedManager
@@ -57,6 +57,14 @@ from pootle_app.models.signals import post_vc_update, post_vc_commit
 from pootle_app.models.signals import post_template_update
 from pootle_app.project_tree import add_files, match_template_filename, direct_language_match_filename
 from pootle_app.project_tree import convert_template, get_translated_name, get_translated_name_gnu
+from pootle_statistics.models import PathStats
+
+TERM_MEMORY_ESTIMATE = 2048
+"""rough memory use in bytes of each term in a terminology matcher"""
+
+INDEX_MARK_LAG = datetime.timedelta(minutes=10)
+"""how long a logged unit change may take to commit and still be
+picked up by the search indexer"""
 
 class TranslationProjectNonDBState(object):
     def __init__(self, parent):
@@ -67,6 +75,10 @@ class TranslationProjectNonDBState(object):
         self._indexing_enabled = True
         self._index_initialized = False
         self.indexer = None
+        # quality checker, rebuilt when checkstyle or language change
+        self.checker = None
+        self.checker_key = None
+        self.checker_lock = threading.Lock()
 
 
 def create_translation_project(language, project):
@@ -93,10 +105,12 @@ class TranslationProjectManager(RelatedManager):
         return self.get(pootle_path=pootle_path)
 
 class TranslationProject(models.Model):
-    _non_db_state_cache = LRUCachingDict(settings.PARSE_POOL_SIZE, settings.PARSE_POOL_CULL_FREQUENCY)
+    _non_db_state_cache = SizedLRUDict(settings.PARSE_POOL_SIZE, settings.PARSE_POOL_MEMORY, name="translation project state")
 
     objects = TranslationProjectManager()
     index_directory = ".translation_index"
+    index_mark = ".translation_index.mark"
+    """file holding the high water mark of the search index"""
     class Meta:
         unique_together = ('language', 'project')
         db_table = 'pootle_app_translationproject'
@@ -122,14 +136,26 @@ class TranslationProject(models.Model):
         self.pootle_path = self.directory.pootle_path
         super(TranslationProject, self).save(*args, **kwargs)
         if created:
+            self.project.forget_template_translationproject()
+            self.forget_stats()
             self.scan_files()
 
     def delete(self, *args, **kwargs):
         directory = self.directory
         super(TranslationProject, self).delete(*args, **kwargs)
         directory.delete()
+        self.project.forget_template_translationproject()
+        self.forget_stats()
         deletefromcache(self, ["getquickstats", "getcompletestats", "get_mtime", "has_suggestions"])
 
+    def forget_stats(self):
+        """drop stats rollups of this translation project and the
+        language and project containing it"""
+        PathStats.objects.forget([self.language.pootle_path, self.project.pootle_path],
+                                 prefix=self.pootle_path)
+        deletefromcache(self.language, ["getquickstats", "get_mtime"])
+        deletefromcache(self.project, ["getquickstats", "get_mtime"])
+
 
     def get_absolute_url(self):
         return l(self.pootle_path)
@@ -150,15 +176,35 @@ class TranslationProject(models.Model):
     file_style = property(_get_treestyle)
 
     def _get_checker(self):
-        checkerclasses = [checks.projectcheckers.get(self.project.checkstyle,
-                                                     checks.StandardChecker),
-                          checks.StandardUnitChecker]
-        return checks.TeeChecker(checkerclasses=checkerclasses,
-                                 errorhandler=self.filtererrorhandler,
-                                 languagecode=self.language.code)
+        key = (self.project.checkstyle, self.language.code)
+        if self.non_db_state.checker_key != key:
+            checkerclasses = [checks.projectcheckers.get(self.project.checkstyle,
+                                                         checks.StandardChecker),
+                              checks.StandardUnitChecker]
+            self.non_db_state.checker = checks.TeeChecker(checkerclasses=checkerclasses,
+                                                          errorhandler=self.filtererrorhandler,
+                                                          languagecode=self.language.code)
+            self.non_db_state.checker_key = key
+        return self.non_db_state.checker
 
     checker = property(_get_checker)
 
+    def run_checks(self, units):
+        """run quality checks over a batch of units, returns a list of
+        (unit, {check name: message}) for units with a translation"""
+        checker = self.checker
+        results = []
+        # checkers keep per unit state while running filters, so the
+        # shared one can't be used by several threads at once
+        self.non_db_state.checker_lock.acquire()
+        try:
+            for unit in units:
+                if unit.target:
+                    results.append((unit, checker.run_filters(unit)))
+        finally:
+            self.non_db_state.checker_lock.release()
+        return results
+
     def filtererrorhandler(self, functionname, str1, str2, e):
         logging.error(u"error in filter %s: %r, %r, %s", functionname, str1, str2, e)
         return False
@@ -169,7 +215,7 @@ class TranslationProject(models.Model):
                 self._non_db_state = self._non_db_state_cache[self.id]
             except KeyError:
                 self._non_db_state = TranslationProjectNonDBState(self)
-                self._non_db_state_cache[self.id] = TranslationProjectNonDBState(self)
+                self._non_db_state_cache[self.id] = self._non_db_state
 
         return self._non_db_state
 
@@ -187,7 +233,7 @@ class TranslationProject(models.Model):
 
     @getfromcache
     def get_mtime(self):
-        return max_column(Unit.objects.filter(store__translation_project=self), 'mtime', None)
+        return self.directory.get_mtime()
 
     def require_units(self):
         """makes sure all stores are parsed"""
@@ -211,7 +257,7 @@ class TranslationProject(models.Model):
         if self.is_template_project:
             return empty_quickstats
         errors = self.require_units()
-        stats = calculate_stats(Unit.objects.filter(store__translation_project=self, state__gt=OBSOLETE))
+        stats = self.directory.get_rollup().get_quickstats()
         stats['errors'] = errors
         return stats
 
@@ -219,10 +265,16 @@ class TranslationProject(models.Model):
     def getcompletestats(self):
         if self.is_template_project:
             return empty_completestats
+        self.require_qualitychecks()
+        return self.directory.get_rollup().get_completestats(self.directory._calculate_completestats)
+
+    def require_qualitychecks(self, background=None):
+        """make sure quality checks of all stores are run or queued"""
         for store in self.stores.filter(state__lt=CHECKED).iterator():
-            store.require_qualitychecks()
-        query = QualityCheck.objects.filter(unit__store__translation_project=self, false_positive=False)
-        return group_by_count(query, 'name')
+            store.require_qualitychecks(background)
+
+    def has_pending_checks(self):
+        return self.stores.filter(state__gte=PARSED, state__lt=CHECKED).exists()
 
     def update_from_templates(self, pootle_path=None):
         """update translation project from templates"""
@@ -276,11 +328,13 @@ class TranslationProject(models.Model):
 
     def _get_indexer(self):
         if self.non_db_state.indexer is None and self.non_db_state._indexing_enabled:
+            if self.get_index_mark() is None:
+                # not built by update_search_index yet, don't build it
+                # while a user waits for search results
+                return None
             try:
                 indexer = self.make_indexer()
-                if not self.non_db_state._index_initialized:
-                    self.init_index(indexer)
-                    self.non_db_state._index_initialized = True
+                self.non_db_state._index_initialized = True
                 self.non_db_state.indexer =  indexer
             except Exception, e:
                 logging.warning(u"Could not initialize indexer for %s in %s: %s", self.project.code, self.language.code, str(e))
@@ -499,6 +553,68 @@ class TranslationProject(models.Model):
                         })
         return index
 
+    def _get_index_mark_path(self):
+        return os.path.join(self.abs_real_path, self.index_mark)
+
+    def get_index_mark(self):
+        """id of the last unit change included in the search index, None
+        if the index hasn't been built"""
+        try:
+            mark_file = open(self._get_index_mark_path())
+            try:
+                return int(mark_file.read())
+            finally:
+                mark_file.close()
+        except (IOError, ValueError):
+            return None
+
+    def set_index_mark(self, mark):
+        mark_path = self._get_index_mark_path()
+        tmpfile, tmpfilename = tempfile.mkstemp(dir=os.path.dirname(mark_path))
+        mark_file = os.fdopen(tmpfile, 'w')
+        try:
+            mark_file.write(str(mark))
+        finally:
+            mark_file.close()
+        os.rename(tmpfilename, mark_path)
+
+    def update_search_index(self):
+        """bring the search index up to date with the unit change log,
+        building it first if needed.
+
+        returns False if there is no indexing engine or building the
+        index failed"""
+        if not have_indexer():
+            return False
+        indexer = self.make_indexer()
+        mark = self.get_index_mark()
+        # changes get their ids when logged but may only be committed
+        # later, so the mark stays INDEX_MARK_LAG behind. changes after
+        # it are processed again next time, which is harmless
+        last_change = UnitChange.objects.get_last_id(before=datetime.datetime.now() - INDEX_MARK_LAG)
+        if mark is None:
+            logging.info(u"Building search index for %s", self.pootle_path)
+            if not self.init_index(indexer):
+                return False
+        else:
+            unit_ids = set(UnitChange.objects.filter(translation_project_id=self.id, id__gt=mark) \
+                           .values_list('unit_id', flat=True))
+            if unit_ids:
+                logging.debug(u"Updating %d units in search index for %s", len(unit_ids), self.pootle_path)
+                indexer.begin_transaction()
+                try:
+                    for unit_id in unit_ids:
+                        indexer.delete_doc({"dbid": str(unit_id)})
+                    units = Unit.objects.filter(id__in=unit_ids).select_related('store')
+                    self.index_units(indexer, units)
+                    indexer.commit_transaction()
+                except:
+                    indexer.cancel_transaction()
+                    raise
+            last_change = max(last_change, mark)
+        self.set_index_mark(last_change)
+        return True
+
     def init_index(self, indexer):
         """initializes the search index"""
         #FIXME: stop relying on pomtime so virtual files can be searchable?
@@ -508,12 +624,14 @@ class TranslationProject(models.Model):
                 self.update_index(indexer, store)
             indexer.commit_transaction()
             indexer.flush(optimize=True)
+            return True
         except Exception, e:
             logging.error(u"Error opening indexer for %s:\n%s", self, e)
             try:
                 indexer.cancel_transaction()
             except:
                 pass
+            return False
 
 
     def update_index(self, indexer, store, unitid=None):
@@ -567,10 +685,20 @@ class TranslationProject(models.Model):
             logging.debug(u"Updating %s indexer for file %s", self.pootle_path, store.pootle_path)
             indexer.delete_doc({"pofilename": store.pootle_path})
             units = store.units
+        self.index_units(indexer, units.select_related('store'), pomtime)
+
+    def index_units(self, indexer, units, pomtime=None):
+        """add documents for units to the search index"""
+        pomtimes = {}
         addlist = []
         for unit in units.iterator():
+            store = unit.store
+            if pomtime is not None:
+                pomtimes[store.id] = pomtime
+            elif store.id not in pomtimes:
+                pomtimes[store.id] = str(hash(store.get_mtime()) ** 2)
             doc = {"pofilename": store.pootle_path,
-                   "pomtime": pomtime,
+                   "pomtime": pomtimes[store.id],
                    "itemno": str(unit.index),
                    "dbid": str(unit.id),
                    }
@@ -593,7 +721,8 @@ class TranslationProject(models.Model):
     ########################################################################################
 
     is_terminology_project = property(lambda self: self.pootle_path.endswith('/terminology/'))
-    is_template_project = property(lambda self: self == self.project.get_template_translationproject())
+    is_template_project = property(lambda self: self.id is not None and \
+                                   self.id == self.project.get_template_translationproject_id())
 
     def gettermmatcher(self):
         """returns the terminology matcher"""
@@ -620,6 +749,8 @@ class TranslationProject(models.Model):
         if mtime != self.non_db_state.termmatchermtime:
             self.non_db_state.termmatcher = match.terminologymatcher(terminology_stores.iterator())
             self.non_db_state.termmatchermtime = mtime
+            term_count = Unit.objects.filter(store__in=terminology_stores).count()
+            self._non_db_state_cache.resize(self.id, SizedLRUDict.default_size + term_count * TERM_MEMORY_ESTIMATE)
         return self.non_db_state.termmatcher
 
     ##############################################################################################
@@ -566,7 +566,7 @@ class UploadHandler(view_handler.Handler):
                                        queryset=translation_project.stores.all(),
                                        help_text=_("Optionally select the file you want to merge with. If not specified, the uploaded file's name is used."))
             upload_to_dir = DirectoryFormField(required=False, label=_('Upload to'),
-                              queryset=Directory.objects.filter(pootle_path__startswith=translation_project.pootle_path).exclude(pk=translation_project.directory.pk),
+                              queryset=Directory.objects.filter(ancestor_links__ancestor=translation_project.directory).exclude(pk=translation_project.directory.pk),
                               help_text=_("Optionally select the file you want to merge with. If not specified, the uploaded file's name is used."))
 
 
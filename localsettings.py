@@ -55,13 +55,52 @@ LIVE_TRANSLATION = False
 # every request, Pootle keeps a pool of already parsed files in memory.
 #
 # Larger pools will offer better performance, but higher memory usage
-# (per server process). When the pool fills up, 1/PARSE_POOL_CULL_FREQUENCY
-# number of files will be removed from the pool.
+# (per server process). The pool holds at most PARSE_POOL_SIZE files and
+# at most an estimated PARSE_POOL_MEMORY bytes, least recently used
+# files are removed first. The same limits apply to the per translation
+# project state (terminology matchers and text indexers). The admin
+# dashboard reports current use and evictions of each server process.
 
 # DEFAULT: 40
 PARSE_POOL_SIZE = 40
-# DEFAULT: 4
-PARSE_POOL_CULL_FREQUENCY = 4
+# DEFAULT: 128 MB
+PARSE_POOL_MEMORY = 128 * 1024 * 1024
+
+# On Linux, with pyinotify installed, set this to True to have each
+# server process watch PODIRECTORY for changes instead of checking the
+# modification time of a file every time it is used. Files changed by
+# other programs are noticed right away.
+# DEFAULT: False
+WATCH_TRANSLATION_FILES = False
+
+# Parsed files can also be kept on disk, shared by all server processes,
+# so files don't need to be parsed again after a restart or when they
+# drop out of a process's pool. Set PARSE_CACHE_DIRECTORY to a directory
+# only writable by the server to enable it. When the cached files grow
+# beyond PARSE_CACHE_SIZE bytes the least recently used are removed.
+# DEFAULT: None
+PARSE_CACHE_DIRECTORY = None
+#PARSE_CACHE_DIRECTORY = working_path('parsecache')
+# DEFAULT: 256 MB
+PARSE_CACHE_SIZE = 256 * 1024 * 1024
+
+# When a file is imported into the database for the first time its units
+# are written PARSE_BATCH_SIZE at a time using multi-row inserts. Set
+# to 0 to add units one by one.
+# DEFAULT: 500
+PARSE_BATCH_SIZE = 500
+
+# Quality checks of a file are run over CHECK_BATCH_SIZE units at a
+# time, failing checks of each batch are saved with a single insert.
+# DEFAULT: 500
+CHECK_BATCH_SIZE = 500
+
+# Run quality checks of files that were never checked in a background
+# thread instead of during the request that first needs them. Until a
+# file is checked its failing checks are shown as pending. Stores left
+# unchecked can be checked with "manage.py refresh_stats".
+# DEFAULT: True
+BACKGROUND_QUALITYCHECKS = True
 
 
 # Cache Backend settings
@@ -91,6 +130,16 @@ CACHE_BACKEND = 'db://pootlecache?max_entries=65536&cull_frequency=16'
 # DEFAULT: 600
 CACHE_MIDDLEWARE_SECONDS = 600
 
+# Stats and other cached values are also kept in a small cache inside
+# each server process, saving a round trip to CACHE_BACKEND. Values are
+# kept for at most LOCAL_CACHE_TIMEOUT seconds, so changes made by other
+# processes may take that long to show. Set LOCAL_CACHE_SIZE to 0 to
+# disable it.
+# DEFAULT: 4096
+LOCAL_CACHE_SIZE = 4096
+# DEFAULT: 10
+LOCAL_CACHE_TIMEOUT = 10
+
 
 # Set this to False. DEBUG mode is only needed when testing beta's or
 # hacking Pootle.
@@ -136,6 +185,15 @@ USE_CAPTCHA = True
 # the files.
 AUTOSYNC = False
 
+# With AUTOSYNC on, setting this to a number of seconds makes Pootle
+# queue changed files and write each of them at most once per
+# AUTOSYNC_DELAY seconds from a background thread, instead of rewriting
+# the whole file on every submission. Queued files are written when the
+# server shuts down, "manage.py flush_autosync" writes all files with
+# unsaved translations.
+# DEFAULT: 0
+AUTOSYNC_DELAY = 0
+
 # Set the backends you want to use to enable translation suggestions through
 # several online services. To disable this feature completely just comment all
 # the lines to set an empty list [] to the MT_BACKENDS setting.
@@ -160,4 +218,6 @@ MT_BACKENDS = [
 # its URL.
 # This URL must point to the public API URL which returns JSON. Don't forget
 # the trailing slash.
+# Pootle answers the same API from its own translations at its tmserver/ URL,
+# set this to '/tmserver/' (after any base URL) to work without a network.
 AMAGAMA_URL = 'http://amagama.locamotion.org/tmserver/'
@@ -97,6 +97,13 @@ def test_levenshtein():
     except ImportError:
         return False
 
+def test_pyinotify():
+    try:
+        import pyinotify
+        return True
+    except ImportError:
+        return False
+
 def test_indexer():
     from translate.search.indexing import _get_available_indexers
     return [indexer.__module__.split('.')[-1] for indexer in _get_available_indexers()]
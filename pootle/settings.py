@@ -92,6 +92,7 @@ MIDDLEWARE_CLASSES = (
     'pootle_misc.middleware.baseurl.BaseUrlMiddleware', # resolves paths
     'django.middleware.transaction.TransactionMiddleware', # needs to be before anything that writes to the db
     'pootle_misc.middleware.siteconfig.SiteConfigMiddleware', # must be early to detect the need to install or update schema, but must precede the cache middleware
+    'pootle_misc.middleware.requestmemo.RequestMemoMiddleware', # dedups stats lookups within a request
     'django.middleware.cache.UpdateCacheMiddleware', # must be as high as possible (see above)
     'django.middleware.http.ConditionalGetMiddleware', # support for e-tag
     'django.middleware.gzip.GZipMiddleware', # compress responses
@@ -170,8 +171,18 @@ MAX_AUTOTERMS = 600
 CONTACT_EMAIL = None
 USE_CAPTCHA = False
 AUTOSYNC = False
+AUTOSYNC_DELAY = 0
 MT_BACKENDS = ()
 CAN_CONTACT = True
+PARSE_BATCH_SIZE = 500
+CHECK_BATCH_SIZE = 500
+BACKGROUND_QUALITYCHECKS = True
+LOCAL_CACHE_SIZE = 4096
+PARSE_POOL_MEMORY = 128 * 1024 * 1024
+WATCH_TRANSLATION_FILES = False
+PARSE_CACHE_DIRECTORY = None
+PARSE_CACHE_SIZE = 256 * 1024 * 1024
+LOCAL_CACHE_TIMEOUT = 10
 
 # By default Pootle sends only text emails. If your organization would
 # prefer to send mixed HTML/TEXT emails, set this to True, and update
@@ -10,7 +10,8 @@ from django.core.management import call_command
 from django.contrib.auth.models import User
 
 from pootle_translationproject.models import scan_translation_projects, TranslationProject
-from pootle_store.models import fs
+from pootle_store.models import fs, QualityCheckName
+from pootle_misc.localcache import local_cache
 
 
 def formset_dict(data):
@@ -30,6 +31,11 @@ class PootleTestCase(TestCase):
         settings.PODIRECTORY = self.testpodir
         fs.location = self.testpodir
         TranslationProject._non_db_state_cache.clear()
+        QualityCheckName.objects._bits.clear()
+        local_cache.clear()
+        # the check worker's own database connection can't see the
+        # test database
+        settings.BACKGROUND_QUALITYCHECKS = False
 
     def _setup_test_files(self):
         gnu = os.path.join(self.testpodir, "terminology")